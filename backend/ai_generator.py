@@ -1,7 +1,43 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 import anthropic
-from typing import List, Optional, Dict
+import httpx
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 MAX_TOOL_ROUNDS = 2  # Maximum sequential tool call rounds per query
+MAX_HISTORY_TOKENS = 2000  # Approximate token budget for conversation history
+CHARS_PER_TOKEN = 4  # Rough English average, avoids a tokenizer round trip
+
+# Connection pool sized for bursty traffic - keeps warm keep-alive connections
+HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Default wait for a message batch - the API expires unfinished batches at 24h
+BATCH_TIMEOUT = 24 * 60 * 60
+
+# Shared pool for running parallel tool calls from a single response
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+# Shared clients keyed by API key so HTTP connections are reused across instances
+_CLIENT_CACHE: Dict[str, anthropic.Anthropic] = {}
+
+
+def _get_client(api_key: str) -> anthropic.Anthropic:
+    """Return the shared Anthropic client for an API key, creating it once"""
+    client = _CLIENT_CACHE.get(api_key)
+    if client is None:
+        http_client = anthropic.DefaultHttpxClient(
+            limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT
+        )
+        client = _CLIENT_CACHE[api_key] = anthropic.Anthropic(
+            api_key=api_key, http_client=http_client
+        )
+    return client
 
 
 class AIGenerator:
@@ -24,6 +60,7 @@ Tool Usage Guidelines:
   - Specific course content or topics
   - Detailed information within lessons
 - **Maximum 2 tool call rounds per query** - Use a second round only if first results are insufficient
+- When several searches are needed (e.g., comparing courses or lessons), request all of them together in a single turn rather than one per round
 - Each search should serve a distinct purpose (e.g., different courses or refining a query)
 - If search yields no results, state this clearly without offering alternatives
 
@@ -47,13 +84,33 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
 
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    # Static prompt as a cacheable block - history goes in a separate block so
+    # the cached prefix stays byte-identical across calls
+    SYSTEM_BLOCK = {
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }
+
+    # Shared tool_choice value - never mutated, so one dict serves every request
+    _TOOL_CHOICE_AUTO = {"type": "auto"}
+
+    # Prefix for the uncached conversation history block
+    HISTORY_PREFIX = "Previous conversation:\n"
+
+    def __init__(self, api_key: str, model: str, fast_model: Optional[str] = None):
+        self.client = _get_client(api_key)
         self.model = model
+        # Model for the final tool-free synthesis round after tool results
+        self.fast_model = fast_model or model
 
         # Pre-build base API parameters
         self.base_params = {"model": self.model, "temperature": 0, "max_tokens": 800}
 
+        # (snapshot of last tool list, its cache-marked copy) - one attribute so
+        # threads sharing the generator never see one half without the other
+        self._tools_cache: Optional[Tuple[List, List]] = None
+
     def generate_response(
         self,
         query: str,
@@ -74,27 +131,22 @@ Provide only the direct answer to what was asked.
             Generated response as string
         """
 
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
-        )
+        system_content = self._build_system_content(conversation_history)
 
         # Prepare API call parameters efficiently
-        api_params = {
-            **self.base_params,
-            "messages": [{"role": "user", "content": query}],
-            "system": system_content,
-        }
+        api_params = self.base_params.copy()
+        api_params["messages"] = [{"role": "user", "content": query}]
+        api_params["system"] = system_content
 
         # Add tools if available
         if tools:
+            tools = self._prepare_tools(tools)
             api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+            api_params["tool_choice"] = self._TOOL_CHOICE_AUTO
 
         # Get response from Claude
         response = self.client.messages.create(**api_params)
+        self._log_cache_usage(response)
 
         # Handle tool execution if needed
         if response.stop_reason == "tool_use" and tool_manager and tools:
@@ -109,11 +161,226 @@ Provide only the direct answer to what was asked.
         # Return direct response
         return self._extract_text_response(response)
 
+    def generate_response_stream(
+        self,
+        query: str,
+        conversation_history: Optional[str] = None,
+        tools: Optional[List] = None,
+        tool_manager=None,
+    ) -> Iterator[str]:
+        """
+        Stream AI response text as it is generated.
+
+        Follows the same tool rules as generate_response (max rounds, stop on
+        tool error) but streams every request so text reaches the caller at
+        first-token latency instead of after the full generation. Text from a
+        round that may call tools is held until the round ends and dropped if
+        it did call them, so preambles like "Let me search..." never reach the
+        caller, matching what generate_response returns.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+
+        Yields:
+            Text chunks of the response
+        """
+        system_content = self._build_system_content(conversation_history)
+        messages = [{"role": "user", "content": query}]
+        if tools:
+            tools = self._prepare_tools(tools)
+
+        include_tools = bool(tools)
+        round_count = 0
+
+        while True:
+            params = self.base_params.copy()
+            params["messages"] = messages
+            params["system"] = system_content
+            if include_tools:
+                params["tools"] = tools
+                params["tool_choice"] = self._TOOL_CHOICE_AUTO
+            elif round_count:
+                params["model"] = self.fast_model
+
+            can_use_tools = bool(include_tools and tool_manager)
+            held = []
+            with self.client.messages.stream(**params) as stream:
+                for text in stream.text_stream:
+                    if can_use_tools:
+                        held.append(text)
+                    else:
+                        yield text
+                response = stream.get_final_message()
+            self._log_cache_usage(response)
+
+            if not (can_use_tools and response.stop_reason == "tool_use"):
+                yield from held
+                return
+
+            round_count += 1
+            messages.append({"role": "assistant", "content": response.content})
+            tool_results, has_error = self._execute_tools(response, tool_manager)
+            messages.append({"role": "user", "content": tool_results})
+
+            # Same rule as the non-streaming loop: one more call, without tools,
+            # after an error or once the round budget is spent
+            include_tools = not has_error and round_count < MAX_TOOL_ROUNDS
+
+    def warm_cache(self, tools: Optional[List] = None):
+        """
+        Issue a minimal request so the tools + system prefix is cached.
+
+        Sends the exact prefix real queries use, with max_tokens=1, so the
+        first user query reads the cache instead of paying the write cost.
+        Repeating it within the 5-minute TTL keeps the cache alive when idle.
+
+        Args:
+            tools: Tool definitions real queries will send
+        """
+        params = self.base_params.copy()
+        params["max_tokens"] = 1
+        params["messages"] = [{"role": "user", "content": "ping"}]
+        params["system"] = self._build_system_content(None)
+        if tools:
+            params["tools"] = self._prepare_tools(tools)
+            params["tool_choice"] = self._TOOL_CHOICE_AUTO
+
+        response = self.client.messages.create(**params)
+        self._log_cache_usage(response)
+
+    def generate_batch(
+        self,
+        queries: List[str],
+        poll_interval: float = 5.0,
+        timeout: float = BATCH_TIMEOUT,
+    ) -> List[str]:
+        """
+        Answer many queries offline through the Message Batches API.
+
+        Intended for non-interactive workloads (bulk evaluation, digests):
+        batch requests are billed at a discount and share the cached system
+        prompt. Tools are not offered since there is no loop to execute them.
+
+        Args:
+            queries: Questions to answer
+            poll_interval: Seconds to wait between batch status checks
+            timeout: Seconds to wait for the batch before cancelling it
+
+        Returns:
+            Response text per query, in input order ("" for failed requests)
+
+        Raises:
+            TimeoutError: If the batch has not ended within timeout
+        """
+        if not queries:
+            return []
+
+        system_content = self._build_system_content(None)
+        requests = []
+        for i, query in enumerate(queries):
+            params = self.base_params.copy()
+            params["messages"] = [{"role": "user", "content": query}]
+            params["system"] = system_content
+            requests.append({"custom_id": str(i), "params": params})
+
+        batch = self.client.messages.batches.create(requests=requests)
+        deadline = time.monotonic() + timeout
+        while batch.processing_status != "ended":
+            if time.monotonic() >= deadline:
+                self.client.messages.batches.cancel(batch.id)
+                raise TimeoutError(
+                    f"Message batch {batch.id} did not finish within {timeout}s"
+                )
+            time.sleep(poll_interval)
+            batch = self.client.messages.batches.retrieve(batch.id)
+
+        responses = [""] * len(queries)
+        for entry in self.client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                responses[int(entry.custom_id)] = self._extract_text_response(
+                    entry.result.message
+                )
+        return responses
+
+    def _build_system_content(self, conversation_history: Optional[str]) -> List[Dict]:
+        """Build system blocks - cached static prompt first, uncached history after"""
+        system_content = [self.SYSTEM_BLOCK]
+        if conversation_history:
+            system_content.append(
+                {
+                    "type": "text",
+                    "text": self.HISTORY_PREFIX
+                    + self._truncate_history(conversation_history),
+                }
+            )
+        return system_content
+
+    @staticmethod
+    def _truncate_history(history: str, max_tokens: int = MAX_HISTORY_TOKENS) -> str:
+        """
+        Keep the most recent part of the history within a token budget.
+
+        Tokens are estimated from character count. Answers span several lines,
+        so the cut is moved forward to the next "User: " message, or failing
+        that the next "Assistant: " one, so the history starts on a message
+        boundary. Only if no message starts within the budget does it fall
+        back to the next line.
+
+        Args:
+            history: Formatted conversation history, oldest line first
+            max_tokens: Approximate token budget
+
+        Returns:
+            History trimmed from the oldest end to fit the budget
+        """
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        if len(history) <= max_chars:
+            return history
+
+        # One extra char so a message starting exactly at the cut still counts
+        window = history[-(max_chars + 1) :]
+        for boundary in ("\nUser: ", "\nAssistant: "):
+            start = window.find(boundary)
+            if start != -1:
+                return window[start + 1 :]
+
+        tail = window[1:]
+        line_start = tail.find("\n")
+        return tail[line_start + 1 :] if line_start != -1 else tail
+
+    def _prepare_tools(self, tools: List[Dict]) -> List[Dict]:
+        """
+        Return tools with a cache breakpoint on the last definition.
+
+        Caching the last tool caches every tool schema before it as a prefix.
+        The marked copy is reused while the caller keeps sending the same (or
+        an equal) list, and the caller's own dicts are never mutated.
+
+        Args:
+            tools: Tool definitions from the tool manager
+
+        Returns:
+            Tool definitions with cache_control on the final entry
+        """
+        cached = self._tools_cache
+        # Compare against a snapshot, not the caller's list, so a list changed
+        # in place still rebuilds. Tool managers hand out the same definition
+        # dicts each call, so the element comparisons stop at identity.
+        if cached is not None and tools == cached[0]:
+            return cached[1]
+
+        marked = tools[:-1] + [{**tools[-1], "cache_control": {"type": "ephemeral"}}]
+        self._tools_cache = (list(tools), marked)
+        return marked
+
     def _handle_tool_loop(
         self,
         response,
         messages: List[Dict],
-        system_content: str,
+        system_content: List[Dict],
         tools: List,
         tool_manager,
     ) -> str:
@@ -122,15 +389,15 @@ Provide only the direct answer to what was asked.
 
         Args:
             response: Initial response containing tool use requests
-            messages: Current message history
-            system_content: System prompt content
+            messages: Current message history - owned by the loop and extended
+                in place, so callers must pass a list they no longer need
+            system_content: System prompt blocks (same list on every round)
             tools: Available tool definitions
             tool_manager: Manager to execute tools
 
         Returns:
             Final response text after tool execution rounds
         """
-        messages = messages.copy()
         round_count = 0
 
         while response.stop_reason == "tool_use" and round_count < MAX_TOOL_ROUNDS:
@@ -145,16 +412,17 @@ Provide only the direct answer to what was asked.
 
             # Include tools only if no error and more rounds allowed
             include_tools = not has_error and round_count < MAX_TOOL_ROUNDS
-            next_params = {
-                **self.base_params,
-                "messages": messages,
-                "system": system_content,
-            }
+            next_params = self.base_params.copy()
+            next_params["messages"] = messages
+            next_params["system"] = system_content
             if include_tools:
                 next_params["tools"] = tools
-                next_params["tool_choice"] = {"type": "auto"}
+                next_params["tool_choice"] = self._TOOL_CHOICE_AUTO
+            else:
+                next_params["model"] = self.fast_model
 
             response = self.client.messages.create(**next_params)
+            self._log_cache_usage(response)
 
             if has_error:
                 break
@@ -165,6 +433,9 @@ Provide only the direct answer to what was asked.
         """
         Execute all tool calls, return (results, has_error).
 
+        Multiple tool calls in one response run concurrently on a shared
+        thread pool; results keep the order of the tool_use blocks.
+
         Args:
             response: Response containing tool_use blocks
             tool_manager: Manager to execute tools
@@ -172,33 +443,61 @@ Provide only the direct answer to what was asked.
         Returns:
             Tuple of (tool_results list, has_error boolean)
         """
-        tool_results = []
-        has_error = False
-
-        for block in response.content:
-            if block.type == "tool_use":
-                try:
-                    result = tool_manager.execute_tool(block.name, **block.input)
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": result,
-                        }
-                    )
-                except Exception as e:
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": f"Error: {str(e)}",
-                            "is_error": True,
-                        }
-                    )
-                    has_error = True
+        tool_blocks = [block for block in response.content if block.type == "tool_use"]
+
+        # Common case: one tool call, run inline
+        if len(tool_blocks) == 1:
+            result, failed = self._run_tool(tool_blocks[0], tool_manager)
+            return [result], failed
+
+        outcomes = list(
+            _TOOL_EXECUTOR.map(
+                lambda block: self._run_tool(block, tool_manager), tool_blocks
+            )
+        )
+
+        tool_results = [result for result, _ in outcomes]
+        has_error = any(failed for _, failed in outcomes)
 
         return tool_results, has_error
 
+    def _run_tool(self, block, tool_manager) -> tuple:
+        """
+        Execute a single tool_use block, return (tool_result, failed).
+
+        Args:
+            block: tool_use content block
+            tool_manager: Manager to execute tools
+
+        Returns:
+            Tuple of (tool_result dict, failed boolean)
+        """
+        try:
+            result = tool_manager.execute_tool(block.name, **block.input)
+            return {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": result,
+            }, False
+        except Exception as e:
+            return {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": f"Error: {str(e)}",
+                "is_error": True,
+            }, True
+
+    def _log_cache_usage(self, response):
+        """Log prompt cache read/write token counts to verify cache hits"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        logger.debug(
+            "Prompt cache: read=%s created=%s",
+            getattr(usage, "cache_read_input_tokens", None),
+            getattr(usage, "cache_creation_input_tokens", None),
+        )
+
     def _extract_text_response(self, response) -> str:
         """
         Extract text from response content blocks.
@@ -209,7 +508,10 @@ Provide only the direct answer to what was asked.
         Returns:
             Text content string
         """
-        for block in response.content:
-            if block.type == "text":
-                return block.text
-        return ""
+        content = response.content
+
+        # Common case: a single text block
+        if len(content) == 1 and content[0].type == "text":
+            return content[0].text
+
+        return next((block.text for block in content if block.type == "text"), "")
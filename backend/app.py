@@ -6,8 +6,11 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
+import json
 import os
 
 from config import config
@@ -76,6 +79,26 @@ async def query_documents(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """Process a query and stream the response as newline-delimited JSON"""
+    session_id = request.session_id
+    if not session_id:
+        session_id = rag_system.session_manager.create_session()
+
+    def events():
+        try:
+            for event in rag_system.query_stream(request.query, session_id):
+                if event["type"] == "sources":
+                    event = {**event, "type": "done", "session_id": session_id}
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report failures in-band
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -96,9 +119,24 @@ async def clear_session(session_id: str):
     return {"status": "cleared", "session_id": session_id}
 
 
+async def keep_prompt_cache_warm():
+    """Refresh the prompt cache before its TTL expires while the server is up"""
+    while True:
+        try:
+            await asyncio.to_thread(rag_system.warm_cache)
+        except Exception as e:
+            print(f"Error warming prompt cache: {e}")
+        await asyncio.sleep(config.CACHE_WARM_INTERVAL)
+
+
+cache_warm_task: Optional[asyncio.Task] = None
+
+
 @app.on_event("startup")
 async def startup_event():
     """Load initial documents on startup"""
+    global cache_warm_task
+
     docs_path = "../docs"
     if os.path.exists(docs_path):
         print("Loading initial documents...")
@@ -110,6 +148,16 @@ async def startup_event():
         except Exception as e:
             print(f"Error loading documents: {e}")
 
+    if config.ANTHROPIC_API_KEY:
+        cache_warm_task = asyncio.create_task(keep_prompt_cache_warm())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the prompt cache refresh task"""
+    if cache_warm_task:
+        cache_warm_task.cancel()
+
 
 # Custom static file handler with no-cache headers for development
 from fastapi.staticfiles import StaticFiles
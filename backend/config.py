@@ -13,6 +13,8 @@ class Config:
     # Anthropic API settings
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
+    ANTHROPIC_FAST_MODEL: str = "claude-3-5-haiku-20241022"  # Post-tool synthesis
+    CACHE_WARM_INTERVAL: int = 240  # Seconds between prompt cache refreshes (TTL 5m)
 
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -23,6 +25,10 @@ class Config:
     MAX_RESULTS: int = 5  # Maximum search results to return
     MAX_HISTORY: int = 2  # Number of conversation messages to remember
 
+    # Response cache settings
+    RESPONSE_CACHE_SIZE: int = 256  # Maximum cached query responses
+    RESPONSE_CACHE_THRESHOLD: float = 0.95  # Cosine similarity for a semantic hit
+
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
 
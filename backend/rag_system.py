@@ -1,12 +1,35 @@
-from typing import List, Tuple, Optional, Dict
+from typing import Any, List, Tuple, Optional, Dict, Iterator
 import os
+import re
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from ai_generator import AIGenerator
 from session_manager import SessionManager
+from response_cache import ResponseCache
 from search_tools import ToolManager, CourseSearchTool, CourseOutlineTool
 from models import Course, Lesson, CourseChunk
 
+# Small talk answered locally - these never need a search or a Claude call
+SMALL_TALK_REPLIES = (
+    (
+        re.compile(r"^\s*(hi|hello|hey|good (morning|afternoon|evening))\W*$", re.I),
+        "Hi! Ask me anything about the course materials.",
+    ),
+    (
+        re.compile(r"^\s*(thanks|thank you|thx|cheers)\W*$", re.I),
+        "You're welcome! Let me know if you have more questions about the courses.",
+    ),
+    (
+        re.compile(r"^\s*(bye|goodbye|see you)\W*$", re.I),
+        "Goodbye! Come back any time you have questions about the courses.",
+    ),
+    (
+        re.compile(r"^\s*what can you do\W*$", re.I),
+        "I can answer questions about the course materials, search lesson "
+        "content, and show course outlines with their lessons and links.",
+    ),
+)
+
 
 class RAGSystem:
     """Main orchestrator for the Retrieval-Augmented Generation system"""
@@ -22,10 +45,19 @@ class RAGSystem:
             config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS
         )
         self.ai_generator = AIGenerator(
-            config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL
+            config.ANTHROPIC_API_KEY,
+            config.ANTHROPIC_MODEL,
+            config.ANTHROPIC_FAST_MODEL,
         )
         self.session_manager = SessionManager(config.MAX_HISTORY)
 
+        # Reuse the vector store's embedding model for near-duplicate queries
+        self.response_cache = ResponseCache(
+            self.vector_store.embedding_function,
+            config.RESPONSE_CACHE_SIZE,
+            config.RESPONSE_CACHE_THRESHOLD,
+        )
+
         # Initialize search tools
         self.tool_manager = ToolManager()
         self.search_tool = CourseSearchTool(self.vector_store)
@@ -55,6 +87,9 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
 
+            # Cached answers may not reflect the new course
+            self.response_cache.clear()
+
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
@@ -116,6 +151,10 @@ class RAGSystem:
                 except Exception as e:
                     print(f"Error processing {file_name}: {e}")
 
+        # Cached answers may not reflect the new or cleared courses
+        if total_courses or clear_existing:
+            self.response_cache.clear()
+
         return total_courses, total_chunks
 
     def query(
@@ -139,19 +178,27 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
 
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
-            query=prompt,
-            conversation_history=history,
-            tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager,
-        )
+        # Serve small talk and repeated questions without calling Claude
+        cached, embedding = self._lookup_response(query, history)
+        if cached:
+            response, sources = cached
+        else:
+            # Sources are collected per query, so concurrent queries stay apart
+            request_tools = self.tool_manager.for_request()
+
+            # Generate response using AI with tools
+            response = self.ai_generator.generate_response(
+                query=prompt,
+                conversation_history=history,
+                tools=request_tools.get_tool_definitions(),
+                tool_manager=request_tools,
+            )
 
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
+            # Get sources from this query's tool calls
+            sources = request_tools.get_sources()
 
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
+            if response:
+                self.response_cache.put(query, history, response, sources, embedding)
 
         # Update conversation history
         if session_id:
@@ -160,6 +207,70 @@ class RAGSystem:
         # Return response with sources from tool searches
         return response, sources
 
+    def query_stream(
+        self, query: str, session_id: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Process a user query, streaming the response as it is generated.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+
+        Yields:
+            {"type": "text", "text": ...} events for each response chunk,
+            then one {"type": "sources", "sources": [...]} event
+        """
+        prompt = f"""Answer this question about course materials: {query}"""
+
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+
+        cached, embedding = self._lookup_response(query, history)
+        if cached:
+            response, sources = cached
+            yield {"type": "text", "text": response}
+        else:
+            request_tools = self.tool_manager.for_request()
+            chunks = []
+            for text in self.ai_generator.generate_response_stream(
+                query=prompt,
+                conversation_history=history,
+                tools=request_tools.get_tool_definitions(),
+                tool_manager=request_tools,
+            ):
+                chunks.append(text)
+                yield {"type": "text", "text": text}
+
+            response = "".join(chunks)
+            sources = request_tools.get_sources()
+
+            if response:
+                self.response_cache.put(query, history, response, sources, embedding)
+
+        # Record the full answer once streaming completes
+        if session_id:
+            self.session_manager.add_exchange(session_id, query, response)
+
+        yield {"type": "sources", "sources": sources}
+
+    def _lookup_response(
+        self, query: str, history: Optional[str]
+    ) -> Tuple[Optional[Tuple[str, List]], Optional[Any]]:
+        """
+        Return (reply, embedding): a small-talk reply or cached response, or
+        None if neither, and the query embedding to pass back to the cache's put
+        """
+        for pattern, reply in SMALL_TALK_REPLIES:
+            if pattern.match(query):
+                return (reply, []), None
+        return self.response_cache.lookup(query, history)
+
+    def warm_cache(self):
+        """Prime Anthropic's prompt cache with the tools and system prompt"""
+        self.ai_generator.warm_cache(tools=self.tool_manager.get_tool_definitions())
+
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
         return {
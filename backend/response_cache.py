@@ -0,0 +1,175 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lesson/course numbers, as digits or small number words. Sentence embeddings
+# barely move between "lesson 1" and "lesson 2", so a semantic hit also needs
+# the same numbers in the same order.
+_NUMBER_WORDS = {
+    word: str(value)
+    for value, word in enumerate(
+        "zero one two three four five six seven eight nine ten".split()
+    )
+}
+_NUMBER_PATTERN = re.compile(r"\b(\d+|" + "|".join(_NUMBER_WORDS) + r")\b")
+
+
+class ResponseCache:
+    """Exact and semantic cache of query responses keyed on query and history"""
+
+    def __init__(
+        self,
+        embedding_function: Callable[[List[str]], List[Any]],
+        max_entries: int = 256,
+        similarity_threshold: float = 0.95,
+    ):
+        self.embedding_function = embedding_function
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+
+        # (normalized query, history) -> (answer, sources, unit embedding or None,
+        # numbers in the query)
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], Tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        """Collapse case and whitespace so trivially different queries match"""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _numbers(normalized_query: str) -> Tuple[str, ...]:
+        """Numbers mentioned in a normalized query, with number words as digits"""
+        return tuple(
+            _NUMBER_WORDS.get(match) or str(int(match))
+            for match in _NUMBER_PATTERN.findall(normalized_query)
+        )
+
+    def _embed(self, query: str) -> Optional[np.ndarray]:
+        """Return the unit-length embedding for a query, or None on failure"""
+        try:
+            vector = np.asarray(self.embedding_function([query])[0], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            logger.warning("Error embedding query for response cache: %s", e)
+            return None
+
+    def get(
+        self, query: str, history: Optional[str] = None
+    ) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        Look up a cached response for a query.
+
+        Tries an exact match on the normalized query first, then falls back to
+        the most similar cached query with the same conversation history.
+
+        Args:
+            query: User's question
+            history: Conversation history the response was generated with
+
+        Returns:
+            Tuple of (answer, sources) on a hit, None on a miss
+        """
+        return self.lookup(query, history)[0]
+
+    def lookup(
+        self, query: str, history: Optional[str] = None
+    ) -> Tuple[Optional[Tuple[str, List[Dict]]], Optional[np.ndarray]]:
+        """
+        Look up a cached response like get(), also returning the query embedding.
+
+        Pass the embedding to put() after a miss so the query is not embedded
+        a second time.
+
+        Args:
+            query: User's question
+            history: Conversation history the response was generated with
+
+        Returns:
+            Tuple of (get() result, unit embedding or None if none was computed)
+        """
+        key = (self._normalize(query), history)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return (entry[0], entry[1]), None
+
+            numbers = self._numbers(key[0])
+            candidates = [
+                (k, e[2])
+                for k, e in self._entries.items()
+                if k[1] == history and e[2] is not None and e[3] == numbers
+            ]
+
+        embedding = None
+        if candidates:
+            embedding = self._embed(query)
+            if embedding is not None:
+                matrix = np.stack([vector for _, vector in candidates])
+                similarities = matrix @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    with self._lock:
+                        entry = self._entries.get(candidates[best][0])
+                        if entry is not None:
+                            self._entries.move_to_end(candidates[best][0])
+                            self.hits += 1
+                            return (entry[0], entry[1]), embedding
+
+        with self._lock:
+            self.misses += 1
+        return None, embedding
+
+    def put(
+        self,
+        query: str,
+        history: Optional[str],
+        answer: str,
+        sources: List[Dict],
+        embedding: Optional[np.ndarray] = None,
+    ):
+        """
+        Store a response, evicting the least recently used entry when full.
+
+        Args:
+            query: User's question
+            history: Conversation history the response was generated with
+            answer: Response text
+            sources: Sources shown with the response
+            embedding: Query embedding from lookup(), computed here if omitted
+        """
+        key = (self._normalize(query), history)
+        if embedding is None:
+            embedding = self._embed(query)
+
+        with self._lock:
+            self._entries[key] = (
+                answer,
+                sources,
+                embedding,
+                self._numbers(key[0]),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached responses, e.g. after the course catalog changes"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
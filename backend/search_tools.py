@@ -1,4 +1,5 @@
-from typing import Dict, Any, Optional, Protocol
+import threading
+from typing import Dict, Any, List, Optional, Protocol, Tuple
 from abc import ABC, abstractmethod
 from vector_store import VectorStore, SearchResults
 
@@ -16,13 +17,16 @@ class Tool(ABC):
         """Execute the tool with given parameters"""
         pass
 
+    def run(self, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute the tool, returning (result, sources to show for this call)"""
+        return self.execute(**kwargs), []
+
 
 class CourseSearchTool(Tool):
     """Tool for searching course content with semantic course name matching"""
 
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []  # Track sources from last search
 
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
@@ -66,6 +70,23 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
+        return self.run(query, course_name, lesson_number)[0]
+
+    def run(
+        self,
+        query: str,
+        course_name: Optional[str] = None,
+        lesson_number: Optional[int] = None,
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Search like execute(), also returning the sources of the results.
+
+        Sources are returned rather than stored on the tool, because one tool
+        instance serves concurrent searches from many requests.
+
+        Returns:
+            Tuple of (formatted results or error message, sources for the UI)
+        """
 
         # Use the vector store's unified search interface
         results = self.store.search(
@@ -74,7 +95,7 @@ class CourseSearchTool(Tool):
 
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
 
         # Handle empty results
         if results.is_empty():
@@ -83,13 +104,15 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
 
         # Format and return results
         return self._format_results(results)
 
-    def _format_results(self, results: SearchResults) -> str:
-        """Format search results with course and lesson context"""
+    def _format_results(
+        self, results: SearchResults
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Format search results with course and lesson context, plus sources"""
         formatted = []
         sources = []  # Track sources for the UI
 
@@ -114,10 +137,7 @@ class CourseSearchTool(Tool):
 
             formatted.append(f"{header}\n{doc}")
 
-        # Store sources for retrieval
-        self.last_sources = sources
-
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 
 class CourseOutlineTool(Tool):
@@ -125,7 +145,6 @@ class CourseOutlineTool(Tool):
 
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []
 
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
@@ -154,12 +173,20 @@ class CourseOutlineTool(Tool):
         Returns:
             Formatted course outline or error message
         """
+        return self.run(course_name)[0]
+
+    def run(self, course_name: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the outline like execute(), also returning the course as source"""
         metadata = self.store.get_course_metadata(course_name)
 
         if not metadata:
-            return f"No course found matching '{course_name}'"
+            return f"No course found matching '{course_name}'", []
 
-        return self._format_outline(metadata)
+        source = {
+            "text": metadata.get("title", "Unknown"),
+            "link": metadata.get("course_link", ""),
+        }
+        return self._format_outline(metadata), [source]
 
     def _format_outline(self, metadata: Dict[str, Any]) -> str:
         """Format course outline for display"""
@@ -175,9 +202,6 @@ class CourseOutlineTool(Tool):
             lesson_title = lesson.get("lesson_title", "Untitled")
             lines.append(f"  {lesson_num}. {lesson_title}")
 
-        # Track source for UI
-        self.last_sources = [{"text": title, "link": course_link}]
-
         return "\n".join(lines)
 
 
@@ -186,6 +210,7 @@ class ToolManager:
 
     def __init__(self):
         self.tools = {}
+        self._definitions = None  # Built once, reset when tools change
 
     def register_tool(self, tool: Tool):
         """Register any tool that implements the Tool interface"""
@@ -194,28 +219,58 @@ class ToolManager:
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
+        self._definitions = None
 
     def get_tool_definitions(self) -> list:
-        """Get all tool definitions for Anthropic tool calling"""
-        return [tool.get_tool_definition() for tool in self.tools.values()]
+        """Get all tool definitions for Anthropic tool calling (shared, read-only)"""
+        if self._definitions is None:
+            self._definitions = [
+                tool.get_tool_definition() for tool in self.tools.values()
+            ]
+        return self._definitions
 
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Execute a tool by name with given parameters"""
+        return self.run_tool(tool_name, **kwargs)[0]
+
+    def run_tool(self, tool_name: str, **kwargs) -> Tuple[str, list]:
+        """Execute a tool by name, returning (result, sources for this call)"""
         if tool_name not in self.tools:
-            return f"Tool '{tool_name}' not found"
-
-        return self.tools[tool_name].execute(**kwargs)
-
-    def get_last_sources(self) -> list:
-        """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, "last_sources") and tool.last_sources:
-                return tool.last_sources
-        return []
-
-    def reset_sources(self):
-        """Reset sources from all tools that track sources"""
-        for tool in self.tools.values():
-            if hasattr(tool, "last_sources"):
-                tool.last_sources = []
+            return f"Tool '{tool_name}' not found", []
+
+        return self.tools[tool_name].run(**kwargs)
+
+    def for_request(self) -> "RequestToolManager":
+        """Tool manager for one query that collects the sources of its tool calls"""
+        return RequestToolManager(self)
+
+
+class RequestToolManager:
+    """
+    Per-query view of a ToolManager that keeps the sources of its own calls.
+
+    The registered tools are shared by every request, so sources live here
+    instead: concurrent or failed queries cannot mix or leave behind sources.
+    """
+
+    def __init__(self, tool_manager: ToolManager):
+        self.tool_manager = tool_manager
+        self._sources = []
+        # Parallel tool calls from one response record sources concurrently
+        self._lock = threading.Lock()
+
+    def get_tool_definitions(self) -> list:
+        """Get the shared tool definitions for Anthropic tool calling"""
+        return self.tool_manager.get_tool_definitions()
+
+    def execute_tool(self, tool_name: str, **kwargs) -> str:
+        """Execute a tool by name and record the sources it returned"""
+        result, sources = self.tool_manager.run_tool(tool_name, **kwargs)
+        with self._lock:
+            self._sources.extend(sources)
+        return result
+
+    def get_sources(self) -> list:
+        """Get the sources of every tool call made through this manager"""
+        with self._lock:
+            return list(self._sources)
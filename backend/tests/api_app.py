@@ -0,0 +1,115 @@
+"""
+Test FastAPI app mirroring app.py's API endpoints, without the static mount.
+
+Kept out of conftest.py so tests can import the app and its request/response
+models from a plain module.
+"""
+
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class QueryRequest(BaseModel):
+    """Request model for course queries"""
+    query: str
+    session_id: Optional[str] = None
+
+
+class QueryResponse(BaseModel):
+    """Response model for course queries"""
+    answer: str
+    sources: List[dict]
+    session_id: str
+
+
+class CourseStats(BaseModel):
+    """Response model for course statistics"""
+    total_courses: int
+    course_titles: List[str]
+
+
+def get_rag_system():
+    """Dependency resolving the RAG system; tests override it with a mock"""
+    raise RuntimeError("get_rag_system must be overridden in tests")
+
+
+def create_test_app():
+    """
+    Create a test FastAPI app with API endpoints only (no static files).
+
+    This avoids import issues with the main app.py which mounts static files
+    from a path that doesn't exist in the test environment. The RAG system is
+    resolved through the get_rag_system dependency so one app can be shared
+    across tests.
+    """
+    from fastapi import Depends, FastAPI, HTTPException
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI(title="Test Course Materials RAG System")
+
+    @app.post("/api/query", response_model=QueryResponse)
+    async def query_documents(
+        request: QueryRequest, mock_rag_system=Depends(get_rag_system)
+    ):
+        """Process a query and return response with sources"""
+        try:
+            session_id = request.session_id
+            if not session_id:
+                session_id = mock_rag_system.session_manager.create_session()
+
+            answer, sources = mock_rag_system.query(request.query, session_id)
+
+            return QueryResponse(
+                answer=answer,
+                sources=sources,
+                session_id=session_id
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/api/query/stream")
+    async def query_documents_stream(
+        request: QueryRequest, mock_rag_system=Depends(get_rag_system)
+    ):
+        """Process a query and stream the response as newline-delimited JSON"""
+        session_id = request.session_id
+        if not session_id:
+            session_id = mock_rag_system.session_manager.create_session()
+
+        def events():
+            try:
+                for event in mock_rag_system.query_stream(request.query, session_id):
+                    if event["type"] == "sources":
+                        event = {**event, "type": "done", "session_id": session_id}
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @app.get("/api/courses", response_model=CourseStats)
+    async def get_course_stats(mock_rag_system=Depends(get_rag_system)):
+        """Get course analytics and statistics"""
+        try:
+            analytics = mock_rag_system.get_course_analytics()
+            return CourseStats(
+                total_courses=analytics["total_courses"],
+                course_titles=analytics["course_titles"]
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.delete("/api/session/{session_id}")
+    async def clear_session(session_id: str, mock_rag_system=Depends(get_rag_system)):
+        """Clear a session's conversation history"""
+        mock_rag_system.session_manager.clear_session(session_id)
+        return {"status": "cleared", "session_id": session_id}
+
+    @app.get("/")
+    async def root():
+        """Health check endpoint for testing"""
+        return {"status": "ok", "message": "RAG System API"}
+
+    return app
@@ -1,102 +1,73 @@
 """Shared pytest fixtures for RAG chatbot tests"""
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, Mock, MagicMock, create_autospec, patch
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List
 
-# Add backend to path for imports
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
+from tests.api_app import create_test_app, get_rag_system
 
-from fastapi import FastAPI, HTTPException
-from fastapi.testclient import TestClient
-from pydantic import BaseModel
 
-from vector_store import SearchResults
-
-
-# ============================================================================
-# API Test App and Models (avoids static file mount issues from main app)
-# ============================================================================
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-slow", action="store_true", default=False, help="run tests marked slow"
+    )
 
-class QueryRequest(BaseModel):
-    """Request model for course queries"""
-    query: str
-    session_id: Optional[str] = None
 
+def pytest_collection_modifyitems(config, items):
+    """Skip @pytest.mark.slow tests unless --run-slow is passed"""
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="needs --run-slow to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
 
-class QueryResponse(BaseModel):
-    """Response model for course queries"""
-    answer: str
-    sources: List[dict]
-    session_id: str
 
+def pytest_ignore_collect(collection_path, config):
+    """
+    Skip importing the integration module under the default -m expression.
 
-class CourseStats(BaseModel):
-    """Response model for course statistics"""
-    total_courses: int
-    course_titles: List[str]
+    Only the exact default from pyproject.toml ('-m "not integration"') skips
+    the module; any other -m value collects it and leaves selection to
+    pytest's own marker deselection.
+    """
+    if collection_path.name != "test_integration_diagnostic.py":
+        return None
+    if config.getoption("markexpr").strip() == "not integration":
+        return True
+    return None
 
 
-def create_test_app(mock_rag_system):
-    """
-    Create a test FastAPI app with API endpoints only (no static files).
+# ============================================================================
+# API Test Fixtures (app and models live in tests/api_app.py)
+# ============================================================================
 
-    This avoids import issues with the main app.py which mounts static files
-    from a path that doesn't exist in the test environment.
-    """
-    app = FastAPI(title="Test Course Materials RAG System")
-
-    @app.post("/api/query", response_model=QueryResponse)
-    async def query_documents(request: QueryRequest):
-        """Process a query and return response with sources"""
-        try:
-            session_id = request.session_id
-            if not session_id:
-                session_id = mock_rag_system.session_manager.create_session()
-
-            answer, sources = mock_rag_system.query(request.query, session_id)
-
-            return QueryResponse(
-                answer=answer,
-                sources=sources,
-                session_id=session_id
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-
-    @app.get("/api/courses", response_model=CourseStats)
-    async def get_course_stats():
-        """Get course analytics and statistics"""
-        try:
-            analytics = mock_rag_system.get_course_analytics()
-            return CourseStats(
-                total_courses=analytics["total_courses"],
-                course_titles=analytics["course_titles"]
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-
-    @app.delete("/api/session/{session_id}")
-    async def clear_session(session_id: str):
-        """Clear a session's conversation history"""
-        mock_rag_system.session_manager.clear_session(session_id)
-        return {"status": "cleared", "session_id": session_id}
-
-    @app.get("/")
-    async def root():
-        """Health check endpoint for testing"""
-        return {"status": "ok", "message": "RAG System API"}
-
-    return app
+# Canned RAG system results, built once; endpoints only read them
+_FAKE_SOURCES = (
+    {"text": "AI Fundamentals - Lesson 1", "link": "https://example.com/lesson1"},
+)
+_FAKE_RESULT = (
+    "This is a test response about machine learning.",
+    list(_FAKE_SOURCES),
+)
+_FAKE_STREAM = (
+    {"type": "text", "text": "This is a test "},
+    {"type": "text", "text": "response about machine learning."},
+    {"type": "sources", "sources": list(_FAKE_SOURCES)},
+)
+_FAKE_ANALYTICS = {
+    "total_courses": 3,
+    "course_titles": ["AI Fundamentals", "Python Basics", "Data Science 101"],
+}
 
 
 @pytest.fixture
 def mock_rag_system():
-    """Mock RAG system for API testing"""
+    """Mock RAG system for API tests that configure it or assert on its calls"""
     rag = Mock()
 
     # Mock session manager
@@ -105,35 +76,95 @@ def mock_rag_system():
     rag.session_manager.clear_session.return_value = None
 
     # Mock query method
-    rag.query.return_value = (
-        "This is a test response about machine learning.",
-        [{"text": "AI Fundamentals - Lesson 1", "link": "https://example.com/lesson1"}]
-    )
+    rag.query.return_value = _FAKE_RESULT
+
+    # Mock query_stream - fresh iterator per call
+    rag.query_stream.side_effect = lambda query, session_id=None: iter(_FAKE_STREAM)
 
     # Mock get_course_analytics
-    rag.get_course_analytics.return_value = {
-        "total_courses": 3,
-        "course_titles": ["AI Fundamentals", "Python Basics", "Data Science 101"]
-    }
+    rag.get_course_analytics.return_value = _FAKE_ANALYTICS
 
     return rag
 
 
-@pytest.fixture
-def test_app(mock_rag_system):
-    """Create test FastAPI app with mocked RAG system"""
-    return create_test_app(mock_rag_system)
+@pytest.fixture(scope="session")
+def mock_rag_system_fast():
+    """Untracked stand-in for mock_rag_system, for tests that only check responses"""
+    return SimpleNamespace(
+        session_manager=SimpleNamespace(
+            create_session=lambda: "test-session-123",
+            clear_session=lambda session_id: None,
+        ),
+        query=lambda query, session_id=None: _FAKE_RESULT,
+        query_stream=lambda query, session_id=None: iter(_FAKE_STREAM),
+        get_course_analytics=lambda: _FAKE_ANALYTICS,
+    )
+
+
+def _rag_for(request):
+    """Tracked mock when the test asks for mock_rag_system, fast stand-in otherwise"""
+    if "mock_rag_system" in request.fixturenames:
+        return request.getfixturevalue("mock_rag_system")
+    return request.getfixturevalue("mock_rag_system_fast")
+
+
+@pytest.fixture(scope="session")
+def test_app():
+    """Test FastAPI app, built once and shared across tests"""
+    return create_test_app()
+
+
+@pytest.fixture(scope="session")
+def session_client(test_app):
+    """Test client bound to the shared app for the whole session"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(test_app) as c:
+        yield c
 
 
 @pytest.fixture
-def client(test_app):
-    """Test client for making HTTP requests"""
-    return TestClient(test_app)
+def client(request, session_client, test_app):
+    """Test client for making HTTP requests against this test's mock RAG system"""
+    rag = _rag_for(request)
+    test_app.dependency_overrides[get_rag_system] = lambda: rag
+    yield session_client
+    test_app.dependency_overrides.clear()
 
 
 @pytest.fixture
+async def async_client(request, test_app):
+    """Async HTTP client over ASGITransport, for issuing requests concurrently"""
+    import httpx
+
+    rag = _rag_for(request)
+    test_app.dependency_overrides[get_rag_system] = lambda: rag
+    transport = httpx.ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+    test_app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="session")
+def endpoint(test_app):
+    """Look up a route's endpoint function to call it directly, skipping HTTP"""
+
+    def lookup(path, method="GET"):
+        for route in test_app.routes:
+            if route.path == path and method in route.methods:
+                return route.endpoint
+        raise LookupError(f"No {method} route for {path}")
+
+    return lookup
+
+
+# The SearchResults fixtures are session-scoped sample data: nothing under test
+# mutates them, so one instance of each is shared by every test
+@pytest.fixture(scope="session")
 def mock_search_results_with_data():
     """SearchResults with sample course content"""
+    from vector_store import SearchResults
+
     return SearchResults(
         documents=[
             "This is content about machine learning basics.",
@@ -147,26 +178,52 @@ def mock_search_results_with_data():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_search_results_empty():
     """Empty SearchResults"""
+    from vector_store import SearchResults
+
     return SearchResults(documents=[], metadata=[], distances=[])
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_search_results_with_error():
     """SearchResults with error"""
+    from vector_store import SearchResults
+
     return SearchResults(
         documents=[], metadata=[], distances=[], error="Search error: connection failed"
     )
 
 
+def _vector_store_returning(results, lesson_link=None):
+    """Mock VectorStore whose search returns the given SearchResults"""
+    store = Mock()
+    store.search.return_value = results
+    store.get_lesson_link.return_value = lesson_link
+    return store
+
+
+_SEARCH_RESULT_FIXTURES = {
+    "populated": "mock_search_results_with_data",
+    "empty": "mock_search_results_empty",
+    "error": "mock_search_results_with_error",
+}
+
+
+@pytest.fixture(params=list(_SEARCH_RESULT_FIXTURES))
+def mock_vector_store_variant(request):
+    """Mock VectorStore for each search outcome: populated, empty and error"""
+    results = request.getfixturevalue(_SEARCH_RESULT_FIXTURES[request.param])
+    return _vector_store_returning(results)
+
+
 @pytest.fixture
 def mock_vector_store(mock_search_results_with_data):
     """Mock VectorStore that returns controlled responses"""
-    store = Mock()
-    store.search.return_value = mock_search_results_with_data
-    store.get_lesson_link.return_value = "https://example.com/lesson/1"
+    store = _vector_store_returning(
+        mock_search_results_with_data, "https://example.com/lesson/1"
+    )
     store.get_course_metadata.return_value = {
         "title": "AI Fundamentals",
         "course_link": "https://example.com/course",
@@ -181,81 +238,73 @@ def mock_vector_store(mock_search_results_with_data):
 @pytest.fixture
 def mock_vector_store_empty(mock_search_results_empty):
     """Mock VectorStore that returns empty results"""
-    store = Mock()
-    store.search.return_value = mock_search_results_empty
-    store.get_lesson_link.return_value = None
-    return store
+    return _vector_store_returning(mock_search_results_empty)
 
 
 @pytest.fixture
 def mock_vector_store_error(mock_search_results_with_error):
     """Mock VectorStore that returns error"""
-    store = Mock()
-    store.search.return_value = mock_search_results_with_error
-    return store
+    return _vector_store_returning(mock_search_results_with_error)
 
 
-@pytest.fixture
-def mock_tool_use_response():
-    """Mock Anthropic response with tool_use"""
-    # Create mock content block for tool use
-    tool_use_block = Mock()
-    tool_use_block.type = "tool_use"
-    tool_use_block.name = "search_course_content"
-    tool_use_block.id = "tool_123"
-    tool_use_block.input = {"query": "machine learning"}
+# Anthropic responses are read-only test data, so build them once per session.
+# They are plain namespaces: nothing asserts on calls to them.
 
-    response = Mock()
-    response.stop_reason = "tool_use"
-    response.content = [tool_use_block]
 
-    return response
+@pytest.fixture(scope="session")
+def mock_tool_use_response():
+    """Mock Anthropic response with tool_use"""
+    tool_use_block = SimpleNamespace(
+        type="tool_use",
+        name="search_course_content",
+        id="tool_123",
+        input={"query": "machine learning"},
+    )
+    return SimpleNamespace(stop_reason="tool_use", content=[tool_use_block])
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_text_response():
     """Mock Anthropic response with text only"""
-    text_block = Mock()
-    text_block.type = "text"
-    text_block.text = "Here is my response about the course content."
-
-    response = Mock()
-    response.stop_reason = "end_turn"
-    response.content = [text_block]
-
-    return response
+    text_block = SimpleNamespace(
+        type="text",
+        text="Here is my response about the course content.",
+    )
+    return SimpleNamespace(stop_reason="end_turn", content=[text_block])
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_final_response():
     """Mock final Anthropic response after tool execution"""
-    text_block = Mock()
-    text_block.type = "text"
-    text_block.text = (
-        "Based on the course materials, machine learning is a subset of AI."
+    text_block = SimpleNamespace(
+        type="text",
+        text="Based on the course materials, machine learning is a subset of AI.",
     )
-
-    response = Mock()
-    response.stop_reason = "end_turn"
-    response.content = [text_block]
-
-    return response
+    return SimpleNamespace(stop_reason="end_turn", content=[text_block])
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_tool_use_response_2():
     """Mock second tool_use response for sequential tool calling tests"""
-    tool_use_block = Mock()
-    tool_use_block.type = "tool_use"
-    tool_use_block.name = "search_course_content"
-    tool_use_block.id = "tool_456"
-    tool_use_block.input = {"query": "deep learning"}
+    tool_use_block = SimpleNamespace(
+        type="tool_use",
+        name="search_course_content",
+        id="tool_456",
+        input={"query": "deep learning"},
+    )
+    return SimpleNamespace(stop_reason="tool_use", content=[tool_use_block])
 
-    response = Mock()
-    response.stop_reason = "tool_use"
-    response.content = [tool_use_block]
 
-    return response
+@pytest.fixture(scope="session")
+def mock_tool_use_response_3():
+    """Mock third tool_use response - one more than MAX_TOOL_ROUNDS allows"""
+    tool_use_block = SimpleNamespace(
+        type="tool_use",
+        name="search_course_content",
+        id="tool_789",
+        input={"query": "neural networks"},
+    )
+    return SimpleNamespace(stop_reason="tool_use", content=[tool_use_block])
 
 
 @pytest.fixture
@@ -263,7 +312,9 @@ def mock_anthropic_client(mock_tool_use_response, mock_final_response):
     """Mock Anthropic client"""
     client = Mock()
     # First call returns tool_use, second returns final response
-    client.messages.create.side_effect = [mock_tool_use_response, mock_final_response]
+    client.messages.create.side_effect = iter(
+        (mock_tool_use_response, mock_final_response)
+    )
     return client
 
 
@@ -285,33 +336,82 @@ def mock_tool_manager():
             },
         }
     ]
-    manager.get_last_sources.return_value = [
-        {"text": "AI Fundamentals - Lesson 1", "link": "https://example.com"}
-    ]
-    manager.reset_sources.return_value = None
     return manager
 
 
-@dataclass
+@dataclass(frozen=True)
 class TestConfig:
-    """Test configuration"""
+    """Test configuration; frozen so the shared session instance stays unchanged"""
 
     ANTHROPIC_API_KEY: str = "test-api-key"
     ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
+    ANTHROPIC_FAST_MODEL: str = "claude-3-5-haiku-20241022"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     CHUNK_SIZE: int = 800
     CHUNK_OVERLAP: int = 100
     MAX_RESULTS: int = 5
     MAX_HISTORY: int = 2
-    CHROMA_PATH: str = "./test_chroma_db"
+    RESPONSE_CACHE_SIZE: int = 256
+    RESPONSE_CACHE_THRESHOLD: float = 0.95
+    CHROMA_PATH: str = ":memory:"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_config():
     """Test configuration fixture"""
     return TestConfig()
 
 
+@pytest.fixture
+def mock_ai_generator():
+    """AIGenerator autospec, so calls with a drifted signature fail"""
+    from ai_generator import AIGenerator
+
+    generator = create_autospec(AIGenerator, instance=True)
+    generator.generate_response.return_value = "Test response"
+    return generator
+
+
+@pytest.fixture
+def mock_session_manager():
+    """SessionManager autospec with no conversation history by default"""
+    from session_manager import SessionManager
+
+    manager = create_autospec(SessionManager, instance=True)
+    manager.get_conversation_history.return_value = None
+    return manager
+
+
+@pytest.fixture
+def rag_mocks(test_config, mock_ai_generator, mock_session_manager):
+    """RAGSystem built with its collaborators patched out, plus the mocks"""
+    from rag_system import RAGSystem
+
+    with patch.multiple(
+        "rag_system",
+        VectorStore=DEFAULT,
+        AIGenerator=DEFAULT,
+        DocumentProcessor=DEFAULT,
+        SessionManager=DEFAULT,
+    ) as mocks:
+        mocks["AIGenerator"].return_value = mock_ai_generator
+        mocks["SessionManager"].return_value = mock_session_manager
+
+        yield SimpleNamespace(
+            rag=RAGSystem(test_config),
+            mock_ai=mock_ai_generator,
+            mock_vector_store=mocks["VectorStore"].return_value,
+            mock_session=mock_session_manager,
+        )
+
+
+@pytest.fixture
+def query_call_kwargs(request, rag_mocks):
+    """Run one query (default or indirect param) and return generate_response kwargs"""
+    rag_mocks.rag.query(getattr(request, "param", "What is machine learning?"))
+    return rag_mocks.mock_ai.generate_response.call_args.kwargs
+
+
 # ============================================================================
 # Integration Test Fixtures (with real data)
 # ============================================================================
@@ -339,12 +439,15 @@ class IntegrationTestConfig:
     """Configuration for integration tests with real components"""
     ANTHROPIC_API_KEY: str = ""
     ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
+    ANTHROPIC_FAST_MODEL: str = "claude-3-5-haiku-20241022"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     CHUNK_SIZE: int = 800
     CHUNK_OVERLAP: int = 100
     MAX_RESULTS: int = 5
     MAX_HISTORY: int = 2
-    CHROMA_PATH: str = ""
+    RESPONSE_CACHE_SIZE: int = 256
+    RESPONSE_CACHE_THRESHOLD: float = 0.95
+    CHROMA_PATH: str = ":memory:"
 
     def __post_init__(self):
         import os
@@ -354,24 +457,82 @@ class IntegrationTestConfig:
             self.ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 
 
-@pytest.fixture(scope="module")
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache of text embeddings for integration runs.
+
+    Keys are lowercased, whitespace-collapsed text; the default embedding model
+    (all-MiniLM-L6-v2) uses an uncased tokenizer, so that normalization does not
+    change the vectors. Only cache misses are sent to the wrapped function, in a
+    single batch.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def embed(self, texts: List[str], embed_fn) -> List:
+        """Return embeddings for texts, computing only the uncached ones"""
+        keys = [" ".join(text.lower().split()) for text in texts]
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            found.update(zip(missing, embed_fn(missing)))
+            with self._lock:
+                for key in missing:
+                    self._entries[key] = found[key]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return [found[key] for key in keys]
+
+
+@pytest.fixture(scope="session")
+def embedding_cache():
+    """Route SentenceTransformer embedding calls through an EmbeddingCache"""
+    from chromadb.utils.embedding_functions import (
+        SentenceTransformerEmbeddingFunction,
+    )
+
+    cache = EmbeddingCache()
+    original_call = SentenceTransformerEmbeddingFunction.__call__
+
+    def cached_call(self, input):
+        return cache.embed(list(input), lambda texts: original_call(self, texts))
+
+    with patch.object(SentenceTransformerEmbeddingFunction, "__call__", cached_call):
+        yield cache
+
+
+@pytest.fixture(scope="session")
 def integration_test_dir(tmp_path_factory):
     """Create a temporary directory for integration tests"""
-    import shutil
-    test_dir = tmp_path_factory.mktemp("integration_test")
-    yield test_dir
-    # Cleanup happens automatically with tmp_path_factory
+    return tmp_path_factory.mktemp("integration_test")
 
 
-@pytest.fixture(scope="module")
-def integration_test_config(integration_test_dir):
-    """Integration test configuration with temporary ChromaDB path"""
-    chroma_path = str(integration_test_dir / "test_chroma_db")
-    config = IntegrationTestConfig(CHROMA_PATH=chroma_path)
-    return config
+@pytest.fixture(scope="session")
+def integration_test_config():
+    """Integration test configuration backed by an in-memory ChromaDB"""
+    return IntegrationTestConfig()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def sample_course_file(integration_test_dir):
     """Create a sample course file for testing"""
     course_file = integration_test_dir / "sample_course.txt"
@@ -379,19 +540,23 @@ def sample_course_file(integration_test_dir):
     return course_file
 
 
-@pytest.fixture(scope="module")
-def loaded_vector_store(integration_test_config, sample_course_file):
-    """VectorStore with sample course data loaded"""
+@pytest.fixture(scope="session")
+def real_vector_store(integration_test_config):
+    """Real VectorStore, built once so the embedding model loads once per session"""
     from vector_store import VectorStore
-    from document_processor import DocumentProcessor
 
-    # Initialize components
-    store = VectorStore(
+    return VectorStore(
         integration_test_config.CHROMA_PATH,
         integration_test_config.EMBEDDING_MODEL,
-        integration_test_config.MAX_RESULTS
+        integration_test_config.MAX_RESULTS,
     )
 
+
+@pytest.fixture(scope="session")
+def loaded_vector_store(real_vector_store, integration_test_config, sample_course_file):
+    """VectorStore with sample course data loaded"""
+    from document_processor import DocumentProcessor
+
     processor = DocumentProcessor(
         integration_test_config.CHUNK_SIZE,
         integration_test_config.CHUNK_OVERLAP
@@ -399,10 +564,65 @@ def loaded_vector_store(integration_test_config, sample_course_file):
 
     # Process and load the sample course
     course, chunks = processor.process_course_document(str(sample_course_file))
-    store.add_course_metadata(course)
-    store.add_course_content(chunks)
+    real_vector_store.add_course_metadata(course)
+    real_vector_store.add_course_content(chunks)
 
-    yield store
+    yield real_vector_store
 
     # Cleanup: clear the data
-    store.clear_all_data()
+    real_vector_store.clear_all_data()
+
+
+# Queries the vector store integration tests assert on, searched as one batch
+INTEGRATION_QUERIES = ("machine learning", "neural networks")
+
+
+@pytest.fixture(scope="session")
+def integration_results(loaded_vector_store):
+    """
+    Search results for INTEGRATION_QUERIES, keyed by query.
+
+    All queries go through a single search_batch() call, so the embedding model
+    runs one batched forward pass instead of one per test.
+    """
+    results = loaded_vector_store.search_batch(list(INTEGRATION_QUERIES))
+    return dict(zip(INTEGRATION_QUERIES, results))
+
+
+@pytest.fixture(scope="session")
+def real_rag_system(integration_test_config, sample_course_file):
+    """
+    RAGSystem on the in-memory test store, seeded once with the sample course.
+
+    In-memory Chroma clients in one process share their data, so this sees the
+    same collections as real_vector_store; add_course_folder skips titles that
+    are already loaded.
+    """
+    from rag_system import RAGSystem
+
+    rag = RAGSystem(integration_test_config)
+    rag.add_course_folder(str(sample_course_file.parent))
+    return rag
+
+
+@pytest.fixture(scope="session")
+def app_config():
+    """The app's real Config, imported (and .env loaded) only by tests that use it"""
+    from config import config
+
+    return config
+
+
+@pytest.fixture(scope="session")
+def requires_anthropic_key(app_config):
+    """Skip, rather than fail on a network timeout, when no API key is configured"""
+    if not app_config.ANTHROPIC_API_KEY:
+        pytest.skip("ANTHROPIC_API_KEY is not set")
+
+
+@pytest.fixture(scope="session")
+def real_ai_generator(app_config):
+    """AIGenerator built from the app config, shared by the live API tests"""
+    from ai_generator import AIGenerator
+
+    return AIGenerator(app_config.ANTHROPIC_API_KEY, app_config.ANTHROPIC_MODEL)
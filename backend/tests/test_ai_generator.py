@@ -1,15 +1,20 @@
 """Tests for AIGenerator tool calling functionality"""
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock
-
-# Add backend to path
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
+import threading
+from types import SimpleNamespace
+from unittest.mock import ANY, DEFAULT, Mock, patch, MagicMock
 
 from ai_generator import AIGenerator
+from search_tools import CourseSearchTool, ToolManager
+from vector_store import SearchResults
+
+pytestmark = pytest.mark.ai_generator
+
+# Shared tool-loop inputs; the loop extends messages in place, so tests pass copies
+_TOOLS = ({"name": "search_course_content", "description": "Search"},)
+_MESSAGES = ({"role": "user", "content": "test"},)
+_TOOL_ERR = RuntimeError("Tool execution failed")
 
 
 class TestAIGeneratorToolCalling:
@@ -20,373 +25,722 @@ class TestAIGeneratorToolCalling:
         mock_client = Mock()
         mock_client.messages.create.return_value = mock_text_response
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-            result = generator.generate_response(
-                query="What is Python?", tools=None, tool_manager=None
-            )
+        result = generator.generate_response(
+            query="What is Python?", tools=None, tool_manager=None
+        )
 
-            assert result == "Here is my response about the course content."
+        assert result == "Here is my response about the course content."
 
     def test_generate_response_with_tool_use_calls_tool_manager(
         self, mock_anthropic_client, mock_tool_manager
     ):
         """Test that tool_manager.execute_tool is called when Claude uses a tool"""
-        with patch(
-            "ai_generator.anthropic.Anthropic", return_value=mock_anthropic_client
-        ):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_anthropic_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_anthropic_client
 
-            result = generator.generate_response(
-                query="What is machine learning?",
-                tools=mock_tool_manager.get_tool_definitions(),
-                tool_manager=mock_tool_manager,
-            )
+        result = generator.generate_response(
+            query="What is machine learning?",
+            tools=mock_tool_manager.get_tool_definitions(),
+            tool_manager=mock_tool_manager,
+        )
 
-            # Verify tool was executed
-            mock_tool_manager.execute_tool.assert_called_once_with(
-                "search_course_content", query="machine learning"
-            )
+        # Verify tool was executed
+        mock_tool_manager.execute_tool.assert_called_once_with(
+            "search_course_content", query="machine learning"
+        )
 
     def test_generate_response_returns_final_response_after_tool_use(
         self, mock_anthropic_client, mock_tool_manager
     ):
         """Test that the final response text is returned after tool execution"""
-        with patch(
-            "ai_generator.anthropic.Anthropic", return_value=mock_anthropic_client
-        ):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_anthropic_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_anthropic_client
 
-            result = generator.generate_response(
-                query="What is machine learning?",
-                tools=mock_tool_manager.get_tool_definitions(),
-                tool_manager=mock_tool_manager,
-            )
+        result = generator.generate_response(
+            query="What is machine learning?",
+            tools=mock_tool_manager.get_tool_definitions(),
+            tool_manager=mock_tool_manager,
+        )
 
-            # Should return the final response from the mock
-            assert "machine learning" in result.lower() or "subset of AI" in result
+        # Should return the final response from the mock
+        assert "machine learning" in result.lower() or "subset of AI" in result
 
     def test_generate_response_includes_tools_in_api_call(self, mock_text_response):
-        """Test that tools are included in the API call parameters"""
+        """Test that tools and tool_choice=auto are included in the API call"""
         mock_client = Mock()
         mock_client.messages.create.return_value = mock_text_response
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-            tools = [{"name": "test_tool", "description": "A test tool"}]
-            generator.generate_response(
-                query="Test query", tools=tools, tool_manager=None
-            )
+        tools = [{"name": "test_tool", "description": "A test tool"}]
+        generator.generate_response(query="Test query", tools=tools, tool_manager=None)
 
-            # Verify tools were passed to the API
-            call_kwargs = mock_client.messages.create.call_args[1]
-            assert "tools" in call_kwargs
-            assert call_kwargs["tools"] == tools
+        mock_client.messages.create.assert_called_once_with(
+            model="test-model",
+            temperature=ANY,
+            max_tokens=ANY,
+            messages=ANY,
+            system=ANY,
+            tools=[{**tools[0], "cache_control": {"type": "ephemeral"}}],
+            tool_choice={"type": "auto"},
+        )
 
-    def test_generate_response_sets_tool_choice_auto(self, mock_text_response):
-        """Test that tool_choice is set to auto when tools are provided"""
+    def test_generate_response_caches_last_tool_definition(self, mock_text_response):
+        """Test that only the last tool carries cache_control and input is untouched"""
         mock_client = Mock()
         mock_client.messages.create.return_value = mock_text_response
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-            tools = [{"name": "test_tool"}]
-            generator.generate_response(
-                query="Test query", tools=tools, tool_manager=None
-            )
+        tools = [{"name": "first_tool"}, {"name": "second_tool"}]
+        generator.generate_response(query="Test query", tools=tools, tool_manager=None)
+
+        sent_tools = mock_client.messages.create.call_args.kwargs["tools"]
+        assert "cache_control" not in sent_tools[0]
+        assert sent_tools[1]["cache_control"] == {"type": "ephemeral"}
+        assert tools == [{"name": "first_tool"}, {"name": "second_tool"}]
+
+    def test_prepare_tools_sees_list_changed_in_place(self):
+        """Test that appending to the caller's list rebuilds the marked copy"""
+        generator = AIGenerator("test-key", "test-model")
+        tools = [{"name": "search_course_content"}]
+        generator._prepare_tools(tools)
+
+        tools.append({"name": "get_course_outline"})
+        prepared = generator._prepare_tools(tools)
+
+        assert [t["name"] for t in prepared] == [
+            "search_course_content",
+            "get_course_outline",
+        ]
+        assert "cache_control" not in prepared[0]
+        assert prepared[1]["cache_control"] == {"type": "ephemeral"}
+
+    def test_prepare_tools_never_returns_unbuilt_list(self):
+        """Test that a caller racing the first build still gets marked tools"""
+        entered, release = threading.Event(), threading.Event()
+
+        class PausingTools(list):
+            """Tool list whose first slice pauses mid-build of the marked copy"""
+
+            paused = False
+
+            def __getitem__(self, index):
+                if isinstance(index, slice) and not PausingTools.paused:
+                    PausingTools.paused = True
+                    entered.set()
+                    release.wait(5)
+                return super().__getitem__(index)
+
+        generator = AIGenerator("test-key", "test-model")
+        tools = PausingTools([{"name": "search_course_content"}])
+
+        first = threading.Thread(target=generator._prepare_tools, args=(tools,))
+        first.start()
+        entered.wait(5)
+        raced = generator._prepare_tools(tools)
+        release.set()
+        first.join()
+
+        assert raced[-1]["cache_control"] == {"type": "ephemeral"}
+
+
+class TestAIGeneratorClient:
+    """Tests for Anthropic client reuse"""
+
+    @pytest.fixture
+    def anthropic_mocks(self):
+        """Empty client cache with the Anthropic and httpx client classes patched"""
+        with (
+            patch.dict("ai_generator._CLIENT_CACHE", clear=True),
+            patch.multiple(
+                "ai_generator.anthropic",
+                Anthropic=DEFAULT,
+                DefaultHttpxClient=DEFAULT,
+            ) as mocks,
+        ):
+            yield mocks
+
+    def test_generators_with_same_key_share_client(self, anthropic_mocks):
+        """Test that one client is created per API key and reused"""
+        MockAnthropic = anthropic_mocks["Anthropic"]
+        MockAnthropic.side_effect = lambda **kw: Mock()
 
-            call_kwargs = mock_client.messages.create.call_args[1]
-            assert call_kwargs["tool_choice"] == {"type": "auto"}
+        first = AIGenerator("shared-key", "test-model")
+        second = AIGenerator("shared-key", "other-model")
+        third = AIGenerator("other-key", "test-model")
+
+        assert first.client is second.client
+        assert third.client is not first.client
+        assert MockAnthropic.call_count == 2
+
+    def test_client_uses_configured_connection_pool(self, anthropic_mocks):
+        """Test that the client is built with a keep-alive pooled HTTP client"""
+        MockHttpClient = anthropic_mocks["DefaultHttpxClient"]
+
+        AIGenerator("pool-key", "test-model")
+
+        http_kwargs = MockHttpClient.call_args.kwargs
+        assert http_kwargs["limits"].max_keepalive_connections == 20
+        assert http_kwargs["limits"].max_connections == 100
+        assert (
+            anthropic_mocks["Anthropic"].call_args.kwargs["http_client"]
+            is MockHttpClient.return_value
+        )
 
 
 class TestAIGeneratorHandleToolLoop:
     """Tests for AIGenerator._handle_tool_loop() method and sequential tool calling"""
 
+    @pytest.fixture
+    def ai_env(self, mock_tool_manager):
+        """Generator wired to a fresh mock client, plus a helper to run the loop"""
+        client = Mock()
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = client
+
+        def run_loop(response, tool_manager=mock_tool_manager):
+            return generator._handle_tool_loop(
+                response,
+                list(_MESSAGES),
+                "test system prompt",
+                list(_TOOLS),
+                tool_manager,
+            )
+
+        return SimpleNamespace(
+            client=client,
+            generator=generator,
+            tool_manager=mock_tool_manager,
+            run_loop=run_loop,
+        )
+
     def test_handle_tool_loop_sends_tool_result_to_claude(
-        self, mock_tool_use_response, mock_final_response, mock_tool_manager
+        self, ai_env, mock_tool_use_response, mock_final_response
     ):
         """Test that tool results are sent back to Claude"""
-        mock_client = Mock()
-        mock_client.messages.create.return_value = mock_final_response
+        ai_env.client.messages.create.return_value = mock_final_response
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        ai_env.run_loop(mock_tool_use_response)
 
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        # Verify API call was made with tool results
+        api_messages = ai_env.client.messages.create.call_args.kwargs["messages"]
 
-            result = generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
-            )
-
-            # Verify API call was made with tool results
-            call_args = mock_client.messages.create.call_args[1]
-            api_messages = call_args["messages"]
-
-            # Should have: user message, assistant tool_use, user tool_result
-            assert len(api_messages) == 3
-            assert api_messages[2]["role"] == "user"
-            # Tool results should be in the content
-            assert isinstance(api_messages[2]["content"], list)
-            assert api_messages[2]["content"][0]["type"] == "tool_result"
+        # Should have: user message, assistant tool_use, user tool_result
+        assert len(api_messages) == 3
+        assert api_messages[2]["role"] == "user"
+        # Tool results should be in the content
+        assert isinstance(api_messages[2]["content"], list)
+        assert api_messages[2]["content"][0]["type"] == "tool_result"
 
     def test_handle_tool_loop_passes_correct_tool_id(
-        self, mock_tool_use_response, mock_final_response, mock_tool_manager
+        self, ai_env, mock_tool_use_response, mock_final_response
     ):
         """Test that the correct tool_use_id is passed in tool_result"""
-        mock_client = Mock()
-        mock_client.messages.create.return_value = mock_final_response
+        ai_env.client.messages.create.return_value = mock_final_response
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        ai_env.run_loop(mock_tool_use_response)
 
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        call_kwargs = ai_env.client.messages.create.call_args.kwargs
+        tool_result = call_kwargs["messages"][2]["content"][0]
 
-            generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
-            )
-
-            call_args = mock_client.messages.create.call_args[1]
-            tool_result = call_args["messages"][2]["content"][0]
-
-            assert tool_result["tool_use_id"] == "tool_123"
+        assert tool_result["tool_use_id"] == "tool_123"
 
     def test_handle_tool_loop_returns_text_response(
-        self, mock_tool_use_response, mock_final_response, mock_tool_manager
+        self, ai_env, mock_tool_use_response, mock_final_response
     ):
         """Test that the final text response is returned"""
-        mock_client = Mock()
-        mock_client.messages.create.return_value = mock_final_response
-
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
-
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        ai_env.client.messages.create.return_value = mock_final_response
 
-            result = generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
-            )
+        result = ai_env.run_loop(mock_tool_use_response)
 
-            assert "machine learning" in result.lower() or "subset of AI" in result
+        assert "machine learning" in result.lower() or "subset of AI" in result
 
     def test_two_sequential_tool_calls_makes_three_api_calls(
         self,
+        ai_env,
         mock_tool_use_response,
         mock_tool_use_response_2,
         mock_final_response,
-        mock_tool_manager,
     ):
         """Test that two sequential tool calls result in three API calls"""
-        mock_client = Mock()
         # First round: tool_use, Second round: tool_use, Final: text
-        mock_client.messages.create.side_effect = [
-            mock_tool_use_response_2,  # After first tool execution
-            mock_final_response,  # After second tool execution (no tools)
-        ]
-
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
-
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
-
-            result = generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
+        ai_env.client.messages.create.side_effect = iter(
+            (
+                mock_tool_use_response_2,  # After first tool execution
+                mock_final_response,  # After second tool execution (no tools)
             )
+        )
+
+        ai_env.run_loop(mock_tool_use_response)
 
-            # Should have made 2 API calls within the loop
-            assert mock_client.messages.create.call_count == 2
-            # Tool manager should have been called twice
-            assert mock_tool_manager.execute_tool.call_count == 2
+        # Should have made 2 API calls within the loop
+        assert ai_env.client.messages.create.call_count == 2
+        # Tool manager should have been called twice
+        assert ai_env.tool_manager.execute_tool.call_count == 2
 
     def test_stops_after_max_rounds(
-        self, mock_tool_use_response, mock_tool_use_response_2, mock_tool_manager
+        self,
+        ai_env,
+        mock_tool_use_response,
+        mock_tool_use_response_2,
+        mock_tool_use_response_3,
     ):
         """Test that loop terminates after MAX_TOOL_ROUNDS even if Claude wants more tools"""
-        # Create a third tool_use response (should not be processed)
-        tool_use_block_3 = Mock()
-        tool_use_block_3.type = "tool_use"
-        tool_use_block_3.name = "search_course_content"
-        tool_use_block_3.id = "tool_789"
-        tool_use_block_3.input = {"query": "neural networks"}
-
-        mock_tool_use_response_3 = Mock()
-        mock_tool_use_response_3.stop_reason = "tool_use"
-        mock_tool_use_response_3.content = [tool_use_block_3]
-
-        mock_client = Mock()
         # Both rounds return tool_use - loop should stop at max rounds
-        mock_client.messages.create.side_effect = [
-            mock_tool_use_response_2,  # Round 1 result
-            mock_tool_use_response_3,  # Round 2 result (should be final, no more iterations)
-        ]
+        ai_env.client.messages.create.side_effect = iter(
+            (
+                mock_tool_use_response_2,  # Round 1 result
+                mock_tool_use_response_3,  # Round 2 result (should be final, no more iterations)
+            )
+        )
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        # This should not raise and should terminate
+        result = ai_env.run_loop(mock_tool_use_response)
 
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        # Should have made exactly 2 API calls (MAX_TOOL_ROUNDS)
+        assert ai_env.client.messages.create.call_count == 2
+        # Result will be empty string since the final response was tool_use
+        assert result == ""
 
-            # This should not raise and should terminate
-            result = generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
+    def test_stops_on_tool_error(
+        self, ai_env, mock_tool_use_response, mock_final_response
+    ):
+        """Test that loop terminates early on tool execution error"""
+        ai_env.client.messages.create.return_value = mock_final_response
+
+        # Create a tool manager that raises an exception
+        failing_tool_manager = Mock()
+        failing_tool_manager.execute_tool.side_effect = _TOOL_ERR
+
+        ai_env.run_loop(mock_tool_use_response, tool_manager=failing_tool_manager)
+
+        # Should have made only 1 API call (stopped after error)
+        assert ai_env.client.messages.create.call_count == 1
+        # Tool manager was called once
+        assert failing_tool_manager.execute_tool.call_count == 1
+
+    def test_parallel_tool_calls_run_concurrently(self, ai_env):
+        """Test that multiple tool_use blocks in one response execute concurrently"""
+        blocks = [
+            SimpleNamespace(
+                type="tool_use",
+                name="search_course_content",
+                id=tool_id,
+                input={"query": query},
             )
+            for tool_id, query in (("tool_a", "first"), ("tool_b", "second"))
+        ]
+        parallel_response = SimpleNamespace(stop_reason="tool_use", content=blocks)
 
-            # Should have made exactly 2 API calls (MAX_TOOL_ROUNDS)
-            assert mock_client.messages.create.call_count == 2
-            # Result will be empty string since the final response was tool_use
-            assert result == ""
+        # Barrier only releases if both tools are running at the same time
+        barrier = threading.Barrier(2, timeout=5)
 
-    def test_stops_on_tool_error(self, mock_tool_use_response, mock_final_response):
-        """Test that loop terminates early on tool execution error"""
-        mock_client = Mock()
-        mock_client.messages.create.return_value = mock_final_response
+        def execute_tool(name, query):
+            barrier.wait()
+            return f"results for {query}"
 
-        # Create a tool manager that raises an exception
-        mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.side_effect = Exception("Tool execution failed")
+        ai_env.tool_manager.execute_tool.side_effect = execute_tool
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        tool_results, has_error = ai_env.generator._execute_tools(
+            parallel_response, ai_env.tool_manager
+        )
 
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        assert not has_error
+        assert [r["tool_use_id"] for r in tool_results] == ["tool_a", "tool_b"]
+        assert tool_results[1]["content"] == "results for second"
 
-            result = generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
+    def test_parallel_searches_keep_every_source(self, ai_env):
+        """Test that concurrent searches on one tool all report their sources"""
+        blocks = [
+            SimpleNamespace(
+                type="tool_use",
+                name="search_course_content",
+                id=f"tool_{lesson}",
+                input={"query": "basics", "lesson_number": lesson},
             )
+            for lesson in (1, 2)
+        ]
+        parallel_response = SimpleNamespace(stop_reason="tool_use", content=blocks)
+
+        # Both searches wait for each other, so their sources are written together
+        barrier = threading.Barrier(2, timeout=5)
+
+        def search(query, course_name, lesson_number):
+            barrier.wait()
+            return SearchResults(
+                documents=[f"Lesson {lesson_number} content"],
+                metadata=[{"course_title": "AI", "lesson_number": lesson_number}],
+                distances=[0.1],
+            )
+
+        store = Mock()
+        store.search.side_effect = search
+        store.get_lesson_link.return_value = None
+        tool_manager = ToolManager()
+        tool_manager.register_tool(CourseSearchTool(store))
+        request_tools = tool_manager.for_request()
+
+        _, has_error = ai_env.generator._execute_tools(parallel_response, request_tools)
 
-            # Should have made only 1 API call (stopped after error)
-            assert mock_client.messages.create.call_count == 1
-            # Tool manager was called once
-            assert mock_tool_manager.execute_tool.call_count == 1
+        assert not has_error
+        sources = sorted(s["text"] for s in request_tools.get_sources())
+        assert sources == ["AI - Lesson 1", "AI - Lesson 2"]
 
     def test_single_round_still_works(
-        self, mock_tool_use_response, mock_final_response, mock_tool_manager
+        self, ai_env, mock_tool_use_response, mock_final_response
     ):
         """Test backward compatibility - single tool call round works correctly"""
+        ai_env.client.messages.create.return_value = mock_final_response
+
+        result = ai_env.run_loop(mock_tool_use_response)
+
+        # Should have made exactly 1 API call
+        assert ai_env.client.messages.create.call_count == 1
+        # Tool manager called once
+        ai_env.tool_manager.execute_tool.assert_called_once()
+        # Should return final response text
+        assert "machine learning" in result.lower() or "subset of AI" in result
+
+    def test_first_round_includes_tools_in_params(
+        self, ai_env, mock_tool_use_response, mock_final_response
+    ):
+        """Test that first round API call includes tools"""
+        ai_env.client.messages.create.return_value = mock_final_response
+
+        ai_env.run_loop(mock_tool_use_response)
+
+        # First call should include tools (since round 1 < MAX_TOOL_ROUNDS)
+        call_kwargs = ai_env.client.messages.create.call_args.kwargs
+        assert "tools" in call_kwargs
+        assert call_kwargs["tool_choice"] == {"type": "auto"}
+
+
+def _mock_stream(texts, final_message):
+    """Build a mock messages.stream() context manager"""
+    stream = MagicMock()
+    stream.__enter__.return_value = stream
+    stream.text_stream = iter(texts)
+    stream.get_final_message.return_value = final_message
+    return stream
+
+
+class TestAIGeneratorStreaming:
+    """Tests for AIGenerator.generate_response_stream()"""
+
+    def test_stream_yields_text_chunks(self, mock_text_response):
+        """Test that text chunks are yielded as they arrive"""
         mock_client = Mock()
-        mock_client.messages.create.return_value = mock_final_response
+        mock_client.messages.stream.return_value = _mock_stream(
+            ["Here is ", "my response."], mock_text_response
+        )
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        chunks = list(generator.generate_response_stream(query="What is Python?"))
 
-            result = generator._handle_tool_loop(
-                mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
+        assert chunks == ["Here is ", "my response."]
+        mock_client.messages.create.assert_not_called()
+
+    def test_stream_executes_tools_then_streams_answer(
+        self, mock_tool_use_response, mock_final_response, mock_tool_manager
+    ):
+        """Test that tool rounds run before the final answer is streamed"""
+        mock_client = Mock()
+        mock_client.messages.stream.side_effect = iter(
+            (
+                _mock_stream([], mock_tool_use_response),
+                _mock_stream(
+                    ["Machine learning ", "is a subset of AI."], mock_final_response
+                ),
             )
+        )
 
-            # Should have made exactly 1 API call
-            assert mock_client.messages.create.call_count == 1
-            # Tool manager called once
-            mock_tool_manager.execute_tool.assert_called_once()
-            # Should return final response text
-            assert "machine learning" in result.lower() or "subset of AI" in result
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-    def test_first_round_includes_tools_in_params(
+        chunks = list(
+            generator.generate_response_stream(
+                query="What is machine learning?",
+                tools=mock_tool_manager.get_tool_definitions(),
+                tool_manager=mock_tool_manager,
+            )
+        )
+
+        assert "".join(chunks) == "Machine learning is a subset of AI."
+        mock_tool_manager.execute_tool.assert_called_once_with(
+            "search_course_content", query="machine learning"
+        )
+        second_call = mock_client.messages.stream.call_args_list[1].kwargs
+        assert second_call["messages"][2]["content"][0]["type"] == "tool_result"
+
+    def test_stream_drops_text_from_tool_rounds(
         self, mock_tool_use_response, mock_final_response, mock_tool_manager
     ):
-        """Test that first round API call includes tools"""
+        """Test that preamble text before a tool call is not streamed"""
         mock_client = Mock()
-        mock_client.messages.create.return_value = mock_final_response
+        mock_client.messages.stream.side_effect = iter(
+            (
+                _mock_stream(["Let me search the course..."], mock_tool_use_response),
+                _mock_stream(["Machine learning is AI."], mock_final_response),
+            )
+        )
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-            tools = [{"name": "search_course_content", "description": "Search"}]
-            messages = [{"role": "user", "content": "test"}]
+        chunks = list(
+            generator.generate_response_stream(
+                query="What is machine learning?",
+                tools=mock_tool_manager.get_tool_definitions(),
+                tool_manager=mock_tool_manager,
+            )
+        )
+
+        assert chunks == ["Machine learning is AI."]
+
+    def test_stream_releases_held_text_when_no_tool_is_called(
+        self, mock_text_response, mock_tool_manager
+    ):
+        """Test that a direct answer in a round offering tools is still returned"""
+        mock_client = Mock()
+        mock_client.messages.stream.return_value = _mock_stream(
+            ["Python is ", "a language."], mock_text_response
+        )
+
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
 
-            generator._handle_tool_loop(
+        chunks = list(
+            generator.generate_response_stream(
+                query="What is Python?",
+                tools=mock_tool_manager.get_tool_definitions(),
+                tool_manager=mock_tool_manager,
+            )
+        )
+
+        assert chunks == ["Python is ", "a language."]
+
+
+class TestAIGeneratorModelRouting:
+    """Tests for routing the post-tool synthesis round to the fast model"""
+
+    def test_final_round_uses_fast_model(
+        self, mock_tool_use_response, mock_tool_use_response_2, mock_final_response
+    ):
+        """Test that tool rounds use the main model and synthesis the fast one"""
+        mock_client = Mock()
+        mock_client.messages.create.side_effect = iter(
+            (
                 mock_tool_use_response,
-                messages,
-                "test system prompt",
-                tools,
-                mock_tool_manager,
+                mock_tool_use_response_2,
+                mock_final_response,
             )
+        )
+        mock_tool_manager = Mock()
+        mock_tool_manager.execute_tool.return_value = "results"
+
+        generator = AIGenerator("test-key", "main-model", "fast-model")
+        generator.client = mock_client
+
+        generator.generate_response(
+            query="Test",
+            tools=[{"name": "search_course_content"}],
+            tool_manager=mock_tool_manager,
+        )
+
+        models = [c.kwargs["model"] for c in mock_client.messages.create.call_args_list]
+        assert models == ["main-model", "main-model", "fast-model"]
 
-            # First call should include tools (since round 1 < MAX_TOOL_ROUNDS)
-            call_args = mock_client.messages.create.call_args[1]
-            assert "tools" in call_args
-            assert call_args["tool_choice"] == {"type": "auto"}
+    def test_fast_model_defaults_to_main_model(self):
+        """Test that omitting fast_model keeps every round on the main model"""
+        generator = AIGenerator("test-key", "main-model")
+
+        assert generator.fast_model == "main-model"
+
+
+class TestAIGeneratorWarmCache:
+    """Tests for AIGenerator.warm_cache()"""
+
+    def test_warm_cache_sends_same_prefix_as_queries(self, mock_text_response):
+        """Test that warming uses the cached tools and system blocks with 1 token"""
+        mock_client = Mock()
+        mock_client.messages.create.return_value = mock_text_response
+
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
+        tools = [{"name": "search_course_content"}]
+
+        generator.warm_cache(tools=tools)
+        warm_kwargs = mock_client.messages.create.call_args.kwargs
+        generator.generate_response(query="Test", tools=tools)
+        query_kwargs = mock_client.messages.create.call_args.kwargs
+
+        assert warm_kwargs["max_tokens"] == 1
+        assert warm_kwargs["system"] == query_kwargs["system"]
+        assert warm_kwargs["tools"] == query_kwargs["tools"]
+        assert warm_kwargs["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+
+
+class TestAIGeneratorBatch:
+    """Tests for AIGenerator.generate_batch()"""
+
+    def test_generate_batch_returns_responses_in_order(self, mock_text_response):
+        """Test that batch results are mapped back to input order"""
+        failed = Mock()
+        failed.custom_id = "0"
+        failed.result.type = "errored"
+
+        succeeded = Mock()
+        succeeded.custom_id = "1"
+        succeeded.result.type = "succeeded"
+        succeeded.result.message = mock_text_response
+
+        pending = Mock(id="batch_1", processing_status="in_progress")
+        ended = Mock(id="batch_1", processing_status="ended")
+
+        mock_client = Mock()
+        mock_client.messages.batches.create.return_value = pending
+        mock_client.messages.batches.retrieve.return_value = ended
+        mock_client.messages.batches.results.return_value = [succeeded, failed]
+
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = mock_client
+
+        responses = generator.generate_batch(["Q1", "Q2"], poll_interval=0)
+
+        assert responses == ["", "Here is my response about the course content."]
+        requests = mock_client.messages.batches.create.call_args.kwargs["requests"]
+        assert [r["custom_id"] for r in requests] == ["0", "1"]
+        assert requests[1]["params"]["messages"][0]["content"] == "Q2"
+        assert requests[0]["params"]["system"][0] is AIGenerator.SYSTEM_BLOCK
+        mock_client.messages.batches.retrieve.assert_called_once_with("batch_1")
+
+    def test_generate_batch_cancels_after_timeout(self):
+        """Test that a batch still running at the deadline is cancelled"""
+        pending = Mock(id="batch_1", processing_status="in_progress")
+
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = Mock()
+        generator.client.messages.batches.create.return_value = pending
+        generator.client.messages.batches.retrieve.return_value = pending
+
+        with pytest.raises(TimeoutError, match="batch_1"):
+            generator.generate_batch(["Q1"], poll_interval=0, timeout=0)
+
+        generator.client.messages.batches.cancel.assert_called_once_with("batch_1")
+        generator.client.messages.batches.results.assert_not_called()
+
+    def test_generate_batch_empty_input_skips_api(self):
+        """Test that no batch is submitted for an empty query list"""
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = Mock()
+
+        assert generator.generate_batch([]) == []
+        generator.client.messages.batches.create.assert_not_called()
+
+
+def test_system_prompt_includes_search_tool_guidance():
+    """Test that system prompt mentions search_course_content tool"""
+    assert "search_course_content" in AIGenerator.SYSTEM_PROMPT
+
+
+def test_system_prompt_includes_outline_tool_guidance():
+    """Test that system prompt mentions get_course_outline tool"""
+    assert "get_course_outline" in AIGenerator.SYSTEM_PROMPT
+
+
+def test_system_prompt_requests_parallel_tool_calls():
+    """Test that system prompt asks for independent searches in one turn"""
+    assert "in a single turn" in AIGenerator.SYSTEM_PROMPT
 
 
 class TestAIGeneratorSystemPrompt:
     """Tests for AIGenerator system prompt"""
 
-    def test_system_prompt_includes_search_tool_guidance(self):
-        """Test that system prompt mentions search_course_content tool"""
-        assert "search_course_content" in AIGenerator.SYSTEM_PROMPT
+    @pytest.fixture(scope="class")
+    def generator(self, mock_text_response):
+        """One generator shared by the class; its client always answers with text"""
+        generator = AIGenerator("test-key", "test-model")
+        generator.client = Mock()
+        generator.client.messages.create.return_value = mock_text_response
+        return generator
 
-    def test_system_prompt_includes_outline_tool_guidance(self):
-        """Test that system prompt mentions get_course_outline tool"""
-        assert "get_course_outline" in AIGenerator.SYSTEM_PROMPT
+    @pytest.fixture(autouse=True)
+    def _reset_client(self, generator):
+        generator.client.messages.create.reset_mock()
 
-    def test_conversation_history_appended_to_system(self, mock_text_response):
+    def test_conversation_history_appended_to_system(self, generator):
         """Test that conversation history is added to system prompt"""
-        mock_client = Mock()
-        mock_client.messages.create.return_value = mock_text_response
+        generator.generate_response(
+            query="Test",
+            conversation_history="Previous: Hello\nAssistant: Hi there",
+            tools=None,
+            tool_manager=None,
+        )
 
-        with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-            generator = AIGenerator("test-key", "test-model")
-            generator.client = mock_client
+        call_kwargs = generator.client.messages.create.call_args.kwargs
+        system_text = "".join(block["text"] for block in call_kwargs["system"])
 
-            generator.generate_response(
-                query="Test",
-                conversation_history="Previous: Hello\nAssistant: Hi there",
-                tools=None,
-                tool_manager=None,
-            )
+        assert "Previous conversation" in system_text
+        assert "Hello" in system_text
+
+    def test_long_history_is_truncated_to_recent_lines(self):
+        """Test that history over budget keeps only the most recent whole lines"""
+        history = "\n".join(f"User: message {i:03d}" for i in range(100))
+
+        truncated = AIGenerator._truncate_history(history, max_tokens=20)
+
+        assert len(truncated) <= 20 * 4
+        assert truncated.startswith("User: message")
+        assert truncated.endswith("User: message 099")
+
+    def test_truncated_history_starts_at_a_user_message(self):
+        """Test that multi-line answers are never cut into orphan lines"""
+        bullets = "\n".join(f"- point {i} about the lesson" for i in range(30))
+        history = "\n".join(
+            f"User: question {i}\nAssistant: Here is the answer:\n{bullets}"
+            for i in range(5)
+        )
+
+        truncated = AIGenerator._truncate_history(history, max_tokens=300)
+
+        assert len(truncated) <= 300 * 4
+        assert truncated.startswith("User: question")
+        assert truncated.endswith("- point 29 about the lesson")
+
+    def test_truncation_falls_back_to_assistant_boundary(self):
+        """Test that a long final answer still starts on its Assistant line"""
+        bullets = "\n".join(f"- point {i} about the lesson" for i in range(30))
+        history = f"User: question\nAssistant: Here is the answer:\n{bullets}"
+
+        # Budget ends a few characters into the only User line
+        max_tokens = (len(history) - 5) // 4
+        truncated = AIGenerator._truncate_history(history, max_tokens=max_tokens)
+
+        assert truncated.startswith("Assistant: Here is the answer:")
+
+    def test_short_history_is_unchanged(self):
+        """Test that history within budget is passed through untouched"""
+        history = "User: Hello\nAssistant: Hi there"
+
+        assert AIGenerator._truncate_history(history) is history
+
+    def test_static_system_prompt_is_cached(self, generator):
+        """Test that the static prompt block carries cache_control and history does not"""
+        generator.generate_response(
+            query="Test",
+            conversation_history="User: Hello\nAssistant: Hi there",
+        )
 
-            call_kwargs = mock_client.messages.create.call_args[1]
-            system_content = call_kwargs["system"]
+        system_blocks = generator.client.messages.create.call_args.kwargs["system"]
 
-            assert "Previous conversation" in system_content
-            assert "Hello" in system_content
+        assert system_blocks[0]["text"] == AIGenerator.SYSTEM_PROMPT
+        assert system_blocks[0]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in system_blocks[1]
@@ -1,162 +1,162 @@
 """Tests for FastAPI endpoints"""
+import asyncio
+import json
 import pytest
-from unittest.mock import Mock
+
+from tests.api_app import QueryRequest
+
+pytestmark = pytest.mark.api
+
+# Request body serialized once and posted as raw content
+_Q_PAYLOAD = json.dumps({"query": "What is machine learning?"}).encode()
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Raised by the mocked RAG system; built once since Mock re-raises the instance
+_QUERY_ERR = RuntimeError("Database connection failed")
+_STREAM_ERR = RuntimeError("Stream failed")
+_ANALYTICS_ERR = RuntimeError("Storage error")
 
 
 class TestQueryEndpoint:
     """Tests for POST /api/query endpoint"""
 
-    def test_query_returns_200_with_valid_request(self, client):
-        """Test successful query returns 200 status"""
+    def test_query_returns_complete_response(self, client, mock_rag_system):
+        """Test a valid query returns 200 JSON with answer, sources and session_id"""
         response = client.post(
             "/api/query",
-            json={"query": "What is machine learning?"}
+            content=_Q_PAYLOAD,
+            headers=_JSON_HEADERS,
         )
         assert response.status_code == 200
+        assert "application/json" in response.headers["content-type"]
+        mock_rag_system.query.assert_called_once()
 
-    def test_query_returns_answer_in_response(self, client):
-        """Test response contains answer field"""
-        response = client.post(
-            "/api/query",
-            json={"query": "What is machine learning?"}
-        )
         data = response.json()
-        assert "answer" in data
         assert isinstance(data["answer"], str)
         assert len(data["answer"]) > 0
-
-    def test_query_returns_sources_in_response(self, client):
-        """Test response contains sources field"""
-        response = client.post(
-            "/api/query",
-            json={"query": "What is machine learning?"}
-        )
-        data = response.json()
-        assert "sources" in data
         assert isinstance(data["sources"], list)
-
-    def test_query_returns_session_id(self, client):
-        """Test response contains session_id"""
-        response = client.post(
-            "/api/query",
-            json={"query": "What is machine learning?"}
-        )
-        data = response.json()
-        assert "session_id" in data
         assert isinstance(data["session_id"], str)
+        for source in data["sources"]:
+            assert "text" in source
+            assert "link" in source
 
-    def test_query_with_session_id_uses_provided_id(self, client, mock_rag_system):
+    async def test_query_with_session_id_uses_provided_id(
+        self, endpoint, mock_rag_system
+    ):
         """Test that provided session_id is used"""
-        response = client.post(
-            "/api/query",
-            json={"query": "Follow up question", "session_id": "my-session-456"}
+        query_documents = endpoint("/api/query", "POST")
+        response = await query_documents(
+            QueryRequest(query="Follow up question", session_id="my-session-456"),
+            mock_rag_system=mock_rag_system,
         )
-        data = response.json()
-        assert data["session_id"] == "my-session-456"
+        assert response.session_id == "my-session-456"
         mock_rag_system.query.assert_called_with("Follow up question", "my-session-456")
 
-    def test_query_without_session_id_creates_new_session(self, client, mock_rag_system):
+    async def test_query_without_session_id_creates_new_session(
+        self, endpoint, mock_rag_system
+    ):
         """Test that missing session_id triggers session creation"""
-        response = client.post(
-            "/api/query",
-            json={"query": "New question"}
+        query_documents = endpoint("/api/query", "POST")
+        response = await query_documents(
+            QueryRequest(query="New question"), mock_rag_system=mock_rag_system
         )
-        data = response.json()
-        assert data["session_id"] == "test-session-123"
+        assert response.session_id == "test-session-123"
         mock_rag_system.session_manager.create_session.assert_called_once()
 
-    def test_query_with_empty_query_returns_422(self, client):
-        """Test that empty query returns validation error"""
+    @pytest.mark.parametrize(
+        "payload,expected_status",
+        [
+            # FastAPI validates the model but doesn't require non-empty by default
+            ({"query": ""}, 200),
+            ({}, 422),
+        ],
+        ids=["empty_query", "missing_query_field"],
+    )
+    def test_query_validation(self, client, payload, expected_status):
+        """Test request validation status codes for /api/query"""
+        response = client.post("/api/query", json=payload)
+        assert response.status_code == expected_status
+
+    def test_query_handles_rag_system_exception(self, client, mock_rag_system):
+        """Test that RAG system exceptions return 500"""
+        mock_rag_system.query.side_effect = _QUERY_ERR
         response = client.post(
             "/api/query",
-            json={"query": ""}
+            content=_Q_PAYLOAD,
+            headers=_JSON_HEADERS,
         )
-        # FastAPI validates the model but doesn't require non-empty by default
-        # This test documents current behavior
-        assert response.status_code == 200
+        assert response.status_code == 500
+        assert "Database connection failed" in response.json()["detail"]
+
+
+class TestQueryStreamEndpoint:
+    """Tests for POST /api/query/stream endpoint"""
+
+    def _events(self, response):
+        return [json.loads(line) for line in response.text.splitlines() if line]
 
-    def test_query_missing_query_field_returns_422(self, client):
-        """Test that missing query field returns validation error"""
+    def test_stream_returns_ndjson(self, client):
+        """Test that the stream endpoint returns newline-delimited JSON"""
         response = client.post(
-            "/api/query",
-            json={}
+            "/api/query/stream",
+            content=_Q_PAYLOAD,
+            headers=_JSON_HEADERS,
         )
-        assert response.status_code == 422
+        assert response.status_code == 200
+        assert "application/x-ndjson" in response.headers["content-type"]
 
-    def test_query_sources_have_correct_structure(self, client):
-        """Test that sources have text and link fields"""
+    def test_stream_yields_text_then_done(self, client):
+        """Test that text chunks arrive before the final done event"""
         response = client.post(
-            "/api/query",
-            json={"query": "What is AI?"}
+            "/api/query/stream",
+            content=_Q_PAYLOAD,
+            headers=_JSON_HEADERS,
         )
-        data = response.json()
-        for source in data["sources"]:
-            assert "text" in source
-            assert "link" in source
+        events = self._events(response)
+        text = "".join(e["text"] for e in events if e["type"] == "text")
 
-    def test_query_calls_rag_system_query(self, client, mock_rag_system):
-        """Test that the RAG system query method is called"""
-        client.post(
-            "/api/query",
-            json={"query": "Test query"}
-        )
-        mock_rag_system.query.assert_called()
+        assert text == "This is a test response about machine learning."
+        assert events[-1]["type"] == "done"
+        assert events[-1]["session_id"] == "test-session-123"
+        assert events[-1]["sources"][0]["text"] == "AI Fundamentals - Lesson 1"
 
-    def test_query_handles_rag_system_exception(self, client, mock_rag_system):
-        """Test that RAG system exceptions return 500"""
-        mock_rag_system.query.side_effect = Exception("Database connection failed")
+    def test_stream_reports_errors_in_band(self, client, mock_rag_system):
+        """Test that failures during streaming are sent as an error event"""
+        mock_rag_system.query_stream.side_effect = _STREAM_ERR
         response = client.post(
-            "/api/query",
-            json={"query": "What is AI?"}
+            "/api/query/stream",
+            content=_Q_PAYLOAD,
+            headers=_JSON_HEADERS,
         )
-        assert response.status_code == 500
-        assert "Database connection failed" in response.json()["detail"]
+        events = self._events(response)
+        assert events[-1] == {"type": "error", "detail": "Stream failed"}
 
 
 class TestCoursesEndpoint:
     """Tests for GET /api/courses endpoint"""
 
-    def test_courses_returns_200(self, client):
-        """Test successful request returns 200 status"""
-        response = client.get("/api/courses")
+    async def test_courses_returns_catalog(self, async_client):
+        """Test a catalog request returns 200 JSON with the mocked count and titles"""
+        response = await async_client.get("/api/courses")
         assert response.status_code == 200
+        assert "application/json" in response.headers["content-type"]
 
-    def test_courses_returns_total_courses(self, client):
-        """Test response contains total_courses field"""
-        response = client.get("/api/courses")
         data = response.json()
-        assert "total_courses" in data
         assert isinstance(data["total_courses"], int)
-
-    def test_courses_returns_course_titles(self, client):
-        """Test response contains course_titles field"""
-        response = client.get("/api/courses")
-        data = response.json()
-        assert "course_titles" in data
-        assert isinstance(data["course_titles"], list)
-
-    def test_courses_returns_correct_count(self, client):
-        """Test that total_courses matches mock data"""
-        response = client.get("/api/courses")
-        data = response.json()
         assert data["total_courses"] == 3
-
-    def test_courses_returns_correct_titles(self, client):
-        """Test that course_titles matches mock data"""
-        response = client.get("/api/courses")
-        data = response.json()
+        assert isinstance(data["course_titles"], list)
         assert "AI Fundamentals" in data["course_titles"]
         assert "Python Basics" in data["course_titles"]
         assert "Data Science 101" in data["course_titles"]
 
-    def test_courses_calls_get_course_analytics(self, client, mock_rag_system):
+    async def test_courses_calls_get_course_analytics(self, endpoint, mock_rag_system):
         """Test that get_course_analytics is called"""
-        client.get("/api/courses")
+        await endpoint("/api/courses")(mock_rag_system=mock_rag_system)
         mock_rag_system.get_course_analytics.assert_called_once()
 
     def test_courses_handles_exception(self, client, mock_rag_system):
         """Test that exceptions return 500"""
-        mock_rag_system.get_course_analytics.side_effect = Exception("Storage error")
+        mock_rag_system.get_course_analytics.side_effect = _ANALYTICS_ERR
         response = client.get("/api/courses")
         assert response.status_code == 500
         assert "Storage error" in response.json()["detail"]
@@ -176,47 +176,33 @@ class TestCoursesEndpoint:
 class TestSessionEndpoint:
     """Tests for DELETE /api/session/{session_id} endpoint"""
 
-    def test_clear_session_returns_200(self, client):
-        """Test successful request returns 200 status"""
-        response = client.delete("/api/session/test-session-123")
-        assert response.status_code == 200
-
-    def test_clear_session_returns_status_cleared(self, client):
-        """Test response contains status=cleared"""
-        response = client.delete("/api/session/test-session-123")
-        data = response.json()
-        assert data["status"] == "cleared"
-
-    def test_clear_session_returns_session_id(self, client):
-        """Test response contains the session_id"""
-        response = client.delete("/api/session/my-session-abc")
-        data = response.json()
-        assert data["session_id"] == "my-session-abc"
+    async def test_clear_session_returns_cleared_status(self, async_client):
+        """Test each clear request returns 200 with status=cleared and its session_id"""
+        session_ids = ["test-session-123", "my-session-abc"]
+        responses = await asyncio.gather(
+            *(async_client.delete(f"/api/session/{sid}") for sid in session_ids)
+        )
+        for session_id, response in zip(session_ids, responses):
+            assert response.status_code == 200
+            assert response.json() == {"status": "cleared", "session_id": session_id}
 
-    def test_clear_session_calls_session_manager(self, client, mock_rag_system):
+    async def test_clear_session_calls_session_manager(self, endpoint, mock_rag_system):
         """Test that session_manager.clear_session is called"""
-        client.delete("/api/session/session-to-clear")
+        clear_session = endpoint("/api/session/{session_id}", "DELETE")
+        await clear_session("session-to-clear", mock_rag_system=mock_rag_system)
         mock_rag_system.session_manager.clear_session.assert_called_with("session-to-clear")
 
 
 class TestRootEndpoint:
     """Tests for GET / endpoint (health check)"""
 
-    def test_root_returns_200(self, client):
-        """Test successful request returns 200 status"""
-        response = client.get("/")
+    async def test_root_returns_health_status(self, async_client):
+        """Test the health check returns 200 with status=ok and a message"""
+        response = await async_client.get("/")
         assert response.status_code == 200
 
-    def test_root_returns_status_ok(self, client):
-        """Test response contains status=ok"""
-        response = client.get("/")
         data = response.json()
         assert data["status"] == "ok"
-
-    def test_root_returns_message(self, client):
-        """Test response contains message field"""
-        response = client.get("/")
-        data = response.json()
         assert "message" in data
 
 
@@ -227,29 +213,16 @@ class TestAPIContentTypes:
         """Test that /api/query accepts JSON content type"""
         response = client.post(
             "/api/query",
-            json={"query": "Test"},
-            headers={"Content-Type": "application/json"}
+            content=_Q_PAYLOAD,
+            headers=_JSON_HEADERS,
         )
         assert response.status_code == 200
 
-    def test_query_returns_json(self, client):
-        """Test that /api/query returns JSON content type"""
-        response = client.post(
-            "/api/query",
-            json={"query": "Test"}
-        )
-        assert "application/json" in response.headers["content-type"]
-
-    def test_courses_returns_json(self, client):
-        """Test that /api/courses returns JSON content type"""
-        response = client.get("/api/courses")
-        assert "application/json" in response.headers["content-type"]
-
     def test_invalid_json_returns_422(self, client):
         """Test that invalid JSON returns validation error"""
         response = client.post(
             "/api/query",
             content="not valid json",
-            headers={"Content-Type": "application/json"}
+            headers=_JSON_HEADERS,
         )
         assert response.status_code == 422
@@ -1,15 +1,9 @@
 """Tests for CourseSearchTool.execute() method"""
 
 import pytest
-import sys
-from pathlib import Path
 from unittest.mock import Mock
 
-# Add backend to path
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
-
-from search_tools import CourseSearchTool, ToolManager
+from search_tools import CourseSearchTool, CourseOutlineTool, ToolManager
 from vector_store import SearchResults
 
 
@@ -25,9 +19,12 @@ class TestCourseSearchToolExecute:
         result = tool.execute(query="machine learning")
 
         # Verify search was called
-        mock_vector_store.search.assert_called_once_with(
-            query="machine learning", course_name=None, lesson_number=None
-        )
+        assert mock_vector_store.search.call_count == 1
+        assert mock_vector_store.search.call_args.kwargs == {
+            "query": "machine learning",
+            "course_name": None,
+            "lesson_number": None,
+        }
 
         # Verify result contains expected content
         assert "AI Fundamentals" in result
@@ -36,63 +33,63 @@ class TestCourseSearchToolExecute:
         )
         assert "[" in result  # Should have header brackets
 
-    def test_execute_with_empty_results_returns_no_content_message(
-        self, mock_vector_store_empty
+    @pytest.mark.parametrize(
+        "mock_vector_store_variant,expected",
+        [
+            ("populated", "AI Fundamentals"),
+            ("empty", "No relevant content found"),
+            ("error", "Search error"),
+        ],
+        indirect=["mock_vector_store_variant"],
+    )
+    def test_execute_reports_each_search_outcome(
+        self, mock_vector_store_variant, expected
     ):
-        """Test that execute returns appropriate message when no results found"""
-        tool = CourseSearchTool(mock_vector_store_empty)
-
-        result = tool.execute(query="nonexistent topic")
-
-        assert "No relevant content found" in result
-
-    def test_execute_with_error_returns_error_message(self, mock_vector_store_error):
-        """Test that execute returns error message when search fails"""
-        tool = CourseSearchTool(mock_vector_store_error)
+        """Test that execute returns results, a no-content message or the error"""
+        tool = CourseSearchTool(mock_vector_store_variant)
 
         result = tool.execute(query="any query")
 
-        assert "Search error" in result or "error" in result.lower()
-
-    def test_execute_with_course_filter(self, mock_vector_store):
-        """Test that course_name filter is passed to search"""
-        tool = CourseSearchTool(mock_vector_store)
-
-        tool.execute(query="basics", course_name="AI Fundamentals")
-
-        mock_vector_store.search.assert_called_once_with(
-            query="basics", course_name="AI Fundamentals", lesson_number=None
-        )
-
-    def test_execute_with_lesson_filter(self, mock_vector_store):
-        """Test that lesson_number filter is passed to search"""
-        tool = CourseSearchTool(mock_vector_store)
-
-        tool.execute(query="basics", lesson_number=1)
-
-        mock_vector_store.search.assert_called_once_with(
-            query="basics", course_name=None, lesson_number=1
-        )
-
-    def test_execute_with_both_filters(self, mock_vector_store):
-        """Test that both filters are passed to search"""
+        assert expected in result
+
+    @pytest.mark.parametrize(
+        "filters,expected",
+        [
+            (
+                {"course_name": "AI Fundamentals"},
+                {"course_name": "AI Fundamentals", "lesson_number": None},
+            ),
+            ({"lesson_number": 1}, {"course_name": None, "lesson_number": 1}),
+            (
+                {"course_name": "AI Course", "lesson_number": 2},
+                {"course_name": "AI Course", "lesson_number": 2},
+            ),
+        ],
+        ids=["course_filter", "lesson_filter", "both_filters"],
+    )
+    def test_execute_passes_filters_to_search(
+        self, mock_vector_store, filters, expected
+    ):
+        """Test that course_name and lesson_number filters are passed to search"""
         tool = CourseSearchTool(mock_vector_store)
 
-        tool.execute(query="basics", course_name="AI Course", lesson_number=2)
+        tool.execute(query="basics", **filters)
 
-        mock_vector_store.search.assert_called_once_with(
-            query="basics", course_name="AI Course", lesson_number=2
-        )
+        assert mock_vector_store.search.call_count == 1
+        assert mock_vector_store.search.call_args.kwargs == {
+            "query": "basics",
+            **expected,
+        }
 
     def test_execute_tracks_sources(self, mock_vector_store):
-        """Test that sources are tracked for UI display"""
+        """Test that run returns the sources for UI display with the result"""
         tool = CourseSearchTool(mock_vector_store)
 
-        tool.execute(query="machine learning")
+        result, sources = tool.run(query="machine learning")
 
-        # Verify sources were tracked
-        assert len(tool.last_sources) > 0
-        assert "text" in tool.last_sources[0]
+        assert result == tool.execute(query="machine learning")
+        assert len(sources) > 0
+        assert "text" in sources[0]
 
     def test_execute_empty_results_with_course_filter_mentions_course(
         self, mock_vector_store_empty
@@ -109,115 +106,101 @@ class TestCourseSearchToolExecute:
 class TestCourseSearchToolFormatResults:
     """Tests for CourseSearchTool._format_results() method"""
 
-    def test_format_results_includes_course_title(
-        self, mock_vector_store, mock_search_results_with_data
-    ):
-        """Test that formatted results include course title in header"""
-        tool = CourseSearchTool(mock_vector_store)
+    @pytest.fixture(scope="class")
+    def formatted(self, mock_search_results_with_data):
+        """Sample results formatted once for the class; the tests only read it"""
+        tool = CourseSearchTool(Mock())
+        text, _ = tool._format_results(mock_search_results_with_data)
+        return text
 
-        result = tool._format_results(mock_search_results_with_data)
-
-        assert "AI Fundamentals" in result
+    def test_format_results_includes_course_title(self, formatted):
+        """Test that formatted results include course title in header"""
+        assert "AI Fundamentals" in formatted
 
-    def test_format_results_includes_lesson_number(
-        self, mock_vector_store, mock_search_results_with_data
-    ):
+    def test_format_results_includes_lesson_number(self, formatted):
         """Test that formatted results include lesson number"""
-        tool = CourseSearchTool(mock_vector_store)
-
-        result = tool._format_results(mock_search_results_with_data)
-
-        assert "Lesson 1" in result or "Lesson 2" in result
+        assert "Lesson 1" in formatted or "Lesson 2" in formatted
 
-    def test_format_results_includes_document_content(
-        self, mock_vector_store, mock_search_results_with_data
-    ):
+    def test_format_results_includes_document_content(self, formatted):
         """Test that formatted results include the actual document content"""
-        tool = CourseSearchTool(mock_vector_store)
-
-        result = tool._format_results(mock_search_results_with_data)
-
         assert (
-            "machine learning" in result.lower() or "neural networks" in result.lower()
+            "machine learning" in formatted.lower()
+            or "neural networks" in formatted.lower()
         )
 
-    def test_format_results_separates_multiple_results(
-        self, mock_vector_store, mock_search_results_with_data
-    ):
+    def test_format_results_separates_multiple_results(self, formatted):
         """Test that multiple results are separated"""
-        tool = CourseSearchTool(mock_vector_store)
-
-        result = tool._format_results(mock_search_results_with_data)
-
         # Should have multiple sections (two documents)
-        sections = result.split("\n\n")
-        assert len(sections) >= 2
+        assert len(formatted.split("\n\n")) >= 2
 
 
 class TestToolManager:
     """Tests for ToolManager functionality"""
 
-    def test_register_tool(self, mock_vector_store):
-        """Test that tools can be registered"""
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
+    @pytest.fixture
+    def empty_tool_manager(self):
+        """ToolManager with no tools registered"""
+        return ToolManager()
 
-        manager.register_tool(tool)
+    @pytest.fixture
+    def tool_manager(self, empty_tool_manager, mock_vector_store):
+        """ToolManager with a CourseSearchTool on the mock vector store"""
+        empty_tool_manager.register_tool(CourseSearchTool(mock_vector_store))
+        return empty_tool_manager
 
-        assert "search_course_content" in manager.tools
+    def test_register_tool(self, empty_tool_manager, mock_vector_store):
+        """Test that tools can be registered"""
+        empty_tool_manager.register_tool(CourseSearchTool(mock_vector_store))
 
-    def test_get_tool_definitions(self, mock_vector_store):
-        """Test that tool definitions are returned correctly"""
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+        assert "search_course_content" in empty_tool_manager.tools
 
-        definitions = manager.get_tool_definitions()
+    def test_get_tool_definitions(self, tool_manager):
+        """Test that tool definitions are returned correctly"""
+        definitions = tool_manager.get_tool_definitions()
 
         assert len(definitions) == 1
         assert definitions[0]["name"] == "search_course_content"
         assert "input_schema" in definitions[0]
 
-    def test_execute_tool_calls_correct_tool(self, mock_vector_store):
-        """Test that execute_tool calls the correct registered tool"""
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+    def test_get_tool_definitions_is_cached_until_register(
+        self, tool_manager, mock_vector_store
+    ):
+        """Test that definitions are built once and rebuilt after registration"""
+        first = tool_manager.get_tool_definitions()
+        assert tool_manager.get_tool_definitions() is first
+
+        tool_manager.register_tool(CourseOutlineTool(mock_vector_store))
+        assert len(tool_manager.get_tool_definitions()) == 2
 
-        result = manager.execute_tool("search_course_content", query="test query")
+    def test_execute_tool_calls_correct_tool(self, tool_manager, mock_vector_store):
+        """Test that execute_tool calls the correct registered tool"""
+        tool_manager.execute_tool("search_course_content", query="test query")
 
         # Verify search was called on the vector store
         mock_vector_store.search.assert_called_once()
 
-    def test_execute_tool_unknown_tool_returns_error(self):
+    def test_execute_tool_unknown_tool_returns_error(self, empty_tool_manager):
         """Test that unknown tool names return error message"""
-        manager = ToolManager()
-
-        result = manager.execute_tool("unknown_tool", query="test")
+        result = empty_tool_manager.execute_tool("unknown_tool", query="test")
 
         assert "not found" in result.lower()
 
-    def test_get_last_sources_returns_sources(self, mock_vector_store):
-        """Test that sources are retrieved from tools"""
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+    def test_request_manager_collects_sources(self, tool_manager):
+        """Test that a per-request manager keeps the sources of its tool calls"""
+        request_tools = tool_manager.for_request()
 
-        # Execute a search to populate sources
-        manager.execute_tool("search_course_content", query="test")
+        request_tools.execute_tool("search_course_content", query="test")
 
-        sources = manager.get_last_sources()
+        sources = request_tools.get_sources()
         assert len(sources) > 0
 
-    def test_reset_sources_clears_sources(self, mock_vector_store):
-        """Test that reset_sources clears all tool sources"""
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+    def test_requests_do_not_share_sources(self, tool_manager):
+        """Test that one request's tool calls never show up in another's sources"""
+        first = tool_manager.for_request()
+        second = tool_manager.for_request()
 
-        # Execute search and then reset
-        manager.execute_tool("search_course_content", query="test")
-        manager.reset_sources()
+        first.execute_tool("search_course_content", query="test")
 
-        sources = manager.get_last_sources()
-        assert len(sources) == 0
+        assert first.get_sources()
+        assert second.get_sources() == []
+        assert tool_manager.for_request().get_sources() == []
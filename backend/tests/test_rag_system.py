@@ -1,265 +1,230 @@
 """Tests for RAG system query handling"""
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import DEFAULT, patch
 
-# Add backend to path
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
 
-from rag_system import RAGSystem
+def _searching(answer, lesson_number, error=None):
+    """generate_response stand-in that searches one lesson via the given tools"""
 
+    def generate(query, conversation_history=None, tools=None, tool_manager=None):
+        tool_manager.execute_tool(
+            "search_course_content", query="basics", lesson_number=lesson_number
+        )
+        if error:
+            raise error
+        return answer
 
-class TestRAGSystemQuery:
-    """Tests for RAGSystem.query() method"""
+    return generate
 
-    def test_query_passes_tools_to_ai_generator(self, test_config):
-        """Test that tool definitions are passed to AI generator"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
 
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response"
-            MockAIGenerator.return_value = mock_ai
+def _streaming(chunks, lesson_number):
+    """generate_response_stream stand-in that searches one lesson, then yields"""
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
+    def generate(query, conversation_history=None, tools=None, tool_manager=None):
+        tool_manager.execute_tool(
+            "search_course_content", query="basics", lesson_number=lesson_number
+        )
+        yield from chunks
 
-            rag = RAGSystem(test_config)
+    return generate
 
-            rag.query("What is machine learning?")
 
-            # Verify generate_response was called with tools
-            call_kwargs = mock_ai.generate_response.call_args[1]
-            assert "tools" in call_kwargs
-            assert call_kwargs["tools"] is not None
-            assert len(call_kwargs["tools"]) > 0
+def _lesson_source(lesson_number):
+    return {"text": f"C - Lesson {lesson_number}", "link": None}
 
-    def test_query_passes_tool_manager(self, test_config):
-        """Test that tool_manager is passed to AI generator"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
 
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response"
-            MockAIGenerator.return_value = mock_ai
+@pytest.fixture
+def searchable(rag_mocks):
+    """rag_mocks whose vector store returns one course-C chunk per lesson searched"""
+    from vector_store import SearchResults
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
-
-            rag = RAGSystem(test_config)
-
-            rag.query("What is machine learning?")
-
-            # Verify tool_manager was passed
-            call_kwargs = mock_ai.generate_response.call_args[1]
-            assert "tool_manager" in call_kwargs
-            assert call_kwargs["tool_manager"] is not None
-
-    def test_query_returns_response_and_sources(self, test_config):
-        """Test that query returns both response and sources"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
+    def search(query, course_name=None, lesson_number=None):
+        return SearchResults(
+            documents=[f"Lesson {lesson_number} content"],
+            metadata=[{"course_title": "C", "lesson_number": lesson_number}],
+            distances=[0.1],
+        )
 
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response about ML"
-            MockAIGenerator.return_value = mock_ai
+    rag_mocks.mock_vector_store.search.side_effect = search
+    rag_mocks.mock_vector_store.get_lesson_link.return_value = None
+    return rag_mocks
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
 
-            rag = RAGSystem(test_config)
+class TestRAGSystemQuery:
+    """Tests for RAGSystem.query() method"""
 
-            # Mock the tool manager's get_last_sources
-            rag.tool_manager.get_last_sources = Mock(
-                return_value=[{"text": "Course 1", "link": "http://example.com"}]
-            )
+    def test_query_passes_tools_to_ai_generator(self, query_call_kwargs):
+        """Test that tool definitions are passed to AI generator"""
+        assert "tools" in query_call_kwargs
+        assert query_call_kwargs["tools"] is not None
+        assert len(query_call_kwargs["tools"]) > 0
 
-            response, sources = rag.query("What is ML?")
+    def test_query_passes_tool_manager(self, query_call_kwargs):
+        """Test that tool_manager is passed to AI generator"""
+        assert "tool_manager" in query_call_kwargs
+        assert query_call_kwargs["tool_manager"] is not None
 
-            assert response == "Test response about ML"
-            assert len(sources) > 0
+    def test_query_returns_response_and_sources(self, searchable):
+        """Test that query returns both response and sources"""
+        searchable.mock_ai.generate_response.side_effect = _searching(
+            "Test response about ML", 1
+        )
 
-    def test_query_resets_sources_after_retrieval(self, test_config):
-        """Test that sources are reset after being retrieved"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
+        response, sources = searchable.rag.query("What is ML?")
 
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response"
-            MockAIGenerator.return_value = mock_ai
+        assert response == "Test response about ML"
+        assert sources == [_lesson_source(1)]
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
+    def test_failed_query_sources_do_not_leak(self, searchable):
+        """Test that a query failing after a search leaves no sources behind"""
+        searchable.mock_ai.generate_response.side_effect = _searching(
+            None, 1, error=RuntimeError("API error")
+        )
+        with pytest.raises(RuntimeError):
+            searchable.rag.query("What is in lesson 1?")
 
-            rag = RAGSystem(test_config)
+        searchable.mock_ai.generate_response.side_effect = _searching("Answer", 2)
+        _, sources = searchable.rag.query("What is in lesson 2?")
 
-            # Mock the tool manager methods
-            mock_reset = Mock()
-            rag.tool_manager.reset_sources = mock_reset
+        assert sources == [_lesson_source(2)]
 
-            rag.query("Test query")
+    @pytest.mark.parametrize(
+        "query_call_kwargs", ["What is Python?"], indirect=True, ids=["python"]
+    )
+    def test_query_formats_prompt_correctly(self, query_call_kwargs):
+        """Test that the query is formatted into a prompt"""
+        # Verify the query parameter contains the user's question
+        assert "What is Python?" in query_call_kwargs["query"]
 
-            # Verify reset_sources was called
-            mock_reset.assert_called_once()
+    def test_repeated_query_served_from_cache(self, rag_mocks):
+        """Test that a repeated question does not call the AI generator again"""
+        rag_mocks.mock_vector_store.embedding_function.return_value = [[1.0, 0.0]]
 
-    def test_query_formats_prompt_correctly(self, test_config):
-        """Test that the query is formatted into a prompt"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
+        first = rag_mocks.rag.query("What is machine learning?")
+        second = rag_mocks.rag.query("what is machine learning?")
 
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response"
-            MockAIGenerator.return_value = mock_ai
+        assert second == first
+        rag_mocks.mock_ai.generate_response.assert_called_once()
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
+    @pytest.mark.parametrize("query", ["hi", "Hello!", "thanks", "What can you do?"])
+    def test_small_talk_skips_ai_generator(self, rag_mocks, query):
+        """Test that greetings and thanks are answered without calling Claude"""
+        response, sources = rag_mocks.rag.query(query)
 
-            rag = RAGSystem(test_config)
+        assert response
+        assert sources == []
+        rag_mocks.mock_ai.generate_response.assert_not_called()
 
-            rag.query("What is Python?")
+    def test_small_talk_pattern_requires_whole_query(self, rag_mocks):
+        """Test that questions starting with a greeting still go to Claude"""
+        rag_mocks.rag.query("Hi, what is lesson 2 of the MCP course about?")
 
-            # Verify the query parameter contains the user's question
-            call_kwargs = mock_ai.generate_response.call_args[1]
-            assert "What is Python?" in call_kwargs["query"]
+        rag_mocks.mock_ai.generate_response.assert_called_once()
 
 
 class TestRAGSystemToolRegistration:
     """Tests for tool registration in RAGSystem"""
 
-    def test_search_tool_is_registered(self, test_config):
-        """Test that CourseSearchTool is registered"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator"),
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
+    @pytest.fixture(scope="class")
+    def rag_for_registration(self, test_config):
+        """One patched RAGSystem for the class; these tests only read its tools"""
+        from rag_system import RAGSystem
+
+        with patch.multiple(
+            "rag_system",
+            VectorStore=DEFAULT,
+            AIGenerator=DEFAULT,
+            DocumentProcessor=DEFAULT,
+            SessionManager=DEFAULT,
         ):
+            yield RAGSystem(test_config)
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
-
-            rag = RAGSystem(test_config)
-
-            # Check tool is registered
-            assert "search_course_content" in rag.tool_manager.tools
+    def test_search_tool_is_registered(self, rag_for_registration):
+        """Test that CourseSearchTool is registered"""
+        assert "search_course_content" in rag_for_registration.tool_manager.tools
 
-    def test_outline_tool_is_registered(self, test_config):
+    def test_outline_tool_is_registered(self, rag_for_registration):
         """Test that CourseOutlineTool is registered"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator"),
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
-
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
-
-            rag = RAGSystem(test_config)
+        assert "get_course_outline" in rag_for_registration.tool_manager.tools
 
-            # Check tool is registered
-            assert "get_course_outline" in rag.tool_manager.tools
-
-    def test_both_tools_have_definitions(self, test_config):
+    def test_both_tools_have_definitions(self, rag_for_registration):
         """Test that both tools provide valid definitions"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator"),
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
-
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
-
-            rag = RAGSystem(test_config)
-
-            definitions = rag.tool_manager.get_tool_definitions()
+        definitions = rag_for_registration.tool_manager.get_tool_definitions()
 
-            assert len(definitions) == 2
+        assert len(definitions) == 2
 
-            tool_names = [d["name"] for d in definitions]
-            assert "search_course_content" in tool_names
-            assert "get_course_outline" in tool_names
+        tool_names = [d["name"] for d in definitions]
+        assert "search_course_content" in tool_names
+        assert "get_course_outline" in tool_names
 
 
 class TestRAGSystemSessionHandling:
     """Tests for session handling in RAGSystem"""
 
-    def test_query_with_session_id_gets_history(self, test_config):
+    def test_query_with_session_id_gets_history(self, rag_mocks):
         """Test that conversation history is retrieved for sessions"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager") as MockSessionManager,
-        ):
-
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response"
-            MockAIGenerator.return_value = mock_ai
-
-            mock_session = Mock()
-            mock_session.get_conversation_history.return_value = "Previous conversation"
-            MockSessionManager.return_value = mock_session
+        rag_mocks.mock_session.get_conversation_history.return_value = (
+            "Previous conversation"
+        )
 
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
+        rag_mocks.rag.query("Follow up question", session_id="session123")
 
-            rag = RAGSystem(test_config)
+        # Verify history was retrieved
+        rag_mocks.mock_session.get_conversation_history.assert_called_with("session123")
 
-            rag.query("Follow up question", session_id="session123")
+        # Verify history was passed to AI
+        call_kwargs = rag_mocks.mock_ai.generate_response.call_args.kwargs
+        assert call_kwargs["conversation_history"] == "Previous conversation"
 
-            # Verify history was retrieved
-            mock_session.get_conversation_history.assert_called_with("session123")
-
-            # Verify history was passed to AI
-            call_kwargs = mock_ai.generate_response.call_args[1]
-            assert call_kwargs["conversation_history"] == "Previous conversation"
-
-    def test_query_without_session_has_no_history(self, test_config):
+    def test_query_without_session_has_no_history(self, query_call_kwargs):
         """Test that queries without session_id have no history"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
-
-            mock_ai = Mock()
-            mock_ai.generate_response.return_value = "Test response"
-            MockAIGenerator.return_value = mock_ai
-
-            mock_vector_store = Mock()
-            MockVectorStore.return_value = mock_vector_store
-
-            rag = RAGSystem(test_config)
-
-            rag.query("Single question")
-
-            # Verify history is None
-            call_kwargs = mock_ai.generate_response.call_args[1]
-            assert call_kwargs["conversation_history"] is None
+        assert query_call_kwargs["conversation_history"] is None
+
+    def test_query_stream_yields_text_then_sources(self, searchable):
+        """Test that streamed chunks are forwarded and the exchange is recorded"""
+        searchable.mock_ai.generate_response_stream.side_effect = _streaming(
+            ["Hello ", "world"], 1
+        )
+
+        events = list(searchable.rag.query_stream("Question", session_id="session123"))
+
+        assert events == [
+            {"type": "text", "text": "Hello "},
+            {"type": "text", "text": "world"},
+            {"type": "sources", "sources": [_lesson_source(1)]},
+        ]
+        searchable.mock_session.add_exchange.assert_called_once_with(
+            "session123", "Question", "Hello world"
+        )
+
+    def test_interleaved_streams_keep_their_own_sources(self, searchable):
+        """Test that overlapping streams, as the threadpool runs them, stay apart"""
+        generators = iter((_streaming(["A"], 1), _streaming(["B"], 2)))
+        searchable.mock_ai.generate_response_stream.side_effect = lambda **kwargs: next(
+            generators
+        )(**kwargs)
+        stream_a = searchable.rag.query_stream("What is in lesson 1?")
+        next(stream_a)  # A has searched and is mid-stream
+
+        events_b = list(searchable.rag.query_stream("What is in lesson 2?"))
+        events_a = list(stream_a)
+
+        assert events_a[-1] == {"type": "sources", "sources": [_lesson_source(1)]}
+        assert events_b[-1] == {"type": "sources", "sources": [_lesson_source(2)]}
+
+    def test_closed_stream_sources_do_not_leak(self, searchable):
+        """Test that a stream closed by a disconnect leaves no sources behind"""
+        searchable.mock_ai.generate_response_stream.side_effect = _streaming(
+            ["Partial"], 1
+        )
+        abandoned = searchable.rag.query_stream("What is in lesson 1?")
+        next(abandoned)
+        abandoned.close()
+
+        searchable.mock_ai.generate_response_stream.side_effect = _streaming(
+            ["Answer"], 2
+        )
+        events = list(searchable.rag.query_stream("What is in lesson 2?"))
+
+        assert events[-1] == {"type": "sources", "sources": [_lesson_source(2)]}
@@ -0,0 +1,128 @@
+"""Tests for ResponseCache exact and semantic lookups"""
+
+import pytest
+
+from response_cache import ResponseCache
+
+# Toy embeddings: paraphrases share a direction, unrelated queries do not
+EMBEDDINGS = {
+    "what is machine learning?": [1.0, 0.0, 0.0],
+    "explain machine learning": [0.99, 0.05, 0.0],
+    "what is python?": [0.0, 1.0, 0.0],
+    # Queries that differ only in a number embed almost identically
+    "what is in lesson 1 of the mcp course?": [0.0, 0.0, 1.0],
+    "what is in lesson 2 of the mcp course?": [0.0, 0.02, 1.0],
+    "what does lesson one of the mcp course cover?": [0.0, 0.01, 1.0],
+}
+
+
+def fake_embed(texts):
+    return [EMBEDDINGS[" ".join(t.lower().split())] for t in texts]
+
+
+SOURCES = [{"text": "AI Fundamentals - Lesson 1", "link": None}]
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(fake_embed, max_entries=2, similarity_threshold=0.95)
+
+
+class TestResponseCache:
+    """Tests for ResponseCache"""
+
+    def test_miss_on_empty_cache(self, cache):
+        """Test that an empty cache misses"""
+        assert cache.get("What is machine learning?") is None
+        assert cache.misses == 1
+
+    def test_exact_hit_ignores_case_and_whitespace(self, cache):
+        """Test that normalized duplicates hit the exact layer"""
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+
+        assert cache.get("  what IS machine   learning? ") == ("ML answer", SOURCES)
+        assert cache.hits == 1
+
+    def test_semantic_hit_for_paraphrase(self, cache):
+        """Test that a similar query above the threshold hits"""
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+
+        assert cache.get("Explain machine learning") == ("ML answer", SOURCES)
+
+    def test_semantic_miss_for_unrelated_query(self, cache):
+        """Test that a dissimilar query misses"""
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+
+        assert cache.get("What is Python?") is None
+
+    def test_semantic_miss_when_numbers_differ(self, cache):
+        """Test that near-identical queries about different lessons miss"""
+        cache.put("What is in lesson 1 of the MCP course?", None, "L1", SOURCES)
+
+        assert cache.get("What is in lesson 2 of the MCP course?") is None
+
+    def test_semantic_hit_matches_number_words_to_digits(self, cache):
+        """Test that a paraphrase spelling the lesson number out still hits"""
+        cache.put("What is in lesson 1 of the MCP course?", None, "L1", SOURCES)
+
+        assert cache.get("What does lesson one of the MCP course cover?") == (
+            "L1",
+            SOURCES,
+        )
+
+    def test_history_must_match(self, cache):
+        """Test that entries are only reused with the same conversation history"""
+        cache.put("What is machine learning?", "User: Hi", "ML answer", SOURCES)
+
+        assert cache.get("What is machine learning?") is None
+        assert cache.get("Explain machine learning", "User: Hello") is None
+        assert cache.get("Explain machine learning", "User: Hi") is not None
+
+    def test_evicts_least_recently_used(self, cache):
+        """Test that the oldest entry is evicted once max_entries is exceeded"""
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+        cache.put("What is Python?", None, "Python answer", [])
+        cache.get("What is machine learning?")
+        cache.put("Explain machine learning", None, "ML again", SOURCES)
+
+        assert len(cache) == 2
+        assert cache.get("What is Python?") is None
+
+    def test_miss_then_put_embeds_query_once(self):
+        """Test that the embedding from a missed lookup is reused by put"""
+        embedded = []
+
+        def counting_embed(texts):
+            embedded.extend(texts)
+            return fake_embed(texts)
+
+        cache = ResponseCache(counting_embed)
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+        embedded.clear()
+
+        hit, embedding = cache.lookup("What is Python?")
+        cache.put("What is Python?", None, "Python answer", [], embedding)
+
+        assert hit is None
+        assert embedded == ["What is Python?"]
+        assert cache.get("what is python?") == ("Python answer", [])
+
+    def test_embedding_failure_falls_back_to_exact(self):
+        """Test that a failing embedder still allows exact hits"""
+
+        def broken_embed(texts):
+            raise RuntimeError("model unavailable")
+
+        cache = ResponseCache(broken_embed)
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+
+        assert cache.get("what is machine learning?") == ("ML answer", SOURCES)
+        assert cache.get("Explain machine learning") is None
+
+    def test_clear_drops_entries(self, cache):
+        """Test that clear empties the cache"""
+        cache.put("What is machine learning?", None, "ML answer", SOURCES)
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.get("What is machine learning?") is None
@@ -5,6 +5,9 @@ from dataclasses import dataclass
 from models import Course, CourseChunk
 from sentence_transformers import SentenceTransformer
 
+# CHROMA_PATH value that selects an in-memory store instead of a directory
+IN_MEMORY_PATH = ":memory:"
+
 
 @dataclass
 class SearchResults:
@@ -16,17 +19,23 @@ class SearchResults:
     error: Optional[str] = None
 
     @classmethod
-    def from_chroma(cls, chroma_results: Dict) -> "SearchResults":
-        """Create SearchResults from ChromaDB query results"""
+    def from_chroma(cls, chroma_results: Dict, index: int = 0) -> "SearchResults":
+        """Create SearchResults for one query text of a ChromaDB query result"""
         return cls(
             documents=(
-                chroma_results["documents"][0] if chroma_results["documents"] else []
+                chroma_results["documents"][index]
+                if chroma_results["documents"]
+                else []
             ),
             metadata=(
-                chroma_results["metadatas"][0] if chroma_results["metadatas"] else []
+                chroma_results["metadatas"][index]
+                if chroma_results["metadatas"]
+                else []
             ),
             distances=(
-                chroma_results["distances"][0] if chroma_results["distances"] else []
+                chroma_results["distances"][index]
+                if chroma_results["distances"]
+                else []
             ),
         )
 
@@ -45,10 +54,12 @@ class VectorStore:
 
     def __init__(self, chroma_path: str, embedding_model: str, max_results: int = 5):
         self.max_results = max_results
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=chroma_path, settings=Settings(anonymized_telemetry=False)
-        )
+        # Initialize ChromaDB client; ":memory:" keeps everything in RAM
+        settings = Settings(anonymized_telemetry=False)
+        if chroma_path == IN_MEMORY_PATH:
+            self.client = chromadb.EphemeralClient(settings=settings)
+        else:
+            self.client = chromadb.PersistentClient(path=chroma_path, settings=settings)
 
         # Set up sentence transformer embedding function
         self.embedding_function = (
@@ -90,12 +101,41 @@ class VectorStore:
         Returns:
             SearchResults object with documents and metadata
         """
+        # A batch of one, so single and batched searches share one implementation
+        return self.search_batch([query], course_name, lesson_number, limit)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        course_name: Optional[str] = None,
+        lesson_number: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[SearchResults]:
+        """
+        Search course content for several queries in a single ChromaDB call.
+
+        The queries are embedded in one batch and share the course/lesson filter,
+        so this is cheaper than calling search() once per query.
+
+        Args:
+            queries: What to search for in course content
+            course_name: Optional course name/title to filter every query by
+            lesson_number: Optional lesson number to filter every query by
+            limit: Maximum results to return per query
+
+        Returns:
+            One SearchResults object per query, in the same order
+        """
+        if not queries:
+            return []
+
         # Step 1: Resolve course name if provided
         course_title = None
         if course_name:
             course_title = self._resolve_course_name(course_name)
             if not course_title:
-                return SearchResults.empty(f"No course found matching '{course_name}'")
+                error = f"No course found matching '{course_name}'"
+                return [SearchResults.empty(error) for _ in queries]
 
         # Step 2: Build filter for content search
         filter_dict = self._build_filter(course_title, lesson_number)
@@ -106,11 +146,11 @@ class VectorStore:
 
         try:
             results = self.course_content.query(
-                query_texts=[query], n_results=search_limit, where=filter_dict
+                query_texts=queries, n_results=search_limit, where=filter_dict
             )
-            return SearchResults.from_chroma(results)
+            return [SearchResults.from_chroma(results, i) for i in range(len(queries))]
         except Exception as e:
-            return SearchResults.empty(f"Search error: {str(e)}")
+            return [SearchResults.empty(f"Search error: {str(e)}") for _ in queries]
 
     def _resolve_course_name(self, course_name: str) -> Optional[str]:
         """Use vector search to find best matching course by name"""
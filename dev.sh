@@ -5,6 +5,9 @@
 #   format  - Format code with black
 #   check   - Check formatting without changes
 #   test    - Run tests
+#   retest  - Re-run only the tests that failed last time, stopping at the first
+#   ci      - Format check + tests without writing the pytest cache
+#   integration - Run only the integration tests (needs network + API key)
 #   all     - Run all quality checks
 
 set -e
@@ -25,7 +28,22 @@ check() {
 
 run_tests() {
     echo "Running tests..."
-    uv run pytest backend/tests/ -v
+    uv run pytest backend/tests/ -v -n auto --dist loadfile
+}
+
+rerun_failed() {
+    echo "Re-running last failed tests..."
+    uv run pytest backend/tests/ --lf -x
+}
+
+run_integration_tests() {
+    echo "Running integration tests..."
+    uv run pytest backend/tests/ -v -m integration
+}
+
+run_ci_tests() {
+    echo "Running tests (no cache)..."
+    uv run pytest backend/tests/ -p no:cacheprovider -n auto --dist loadfile
 }
 
 case $COMMAND in
@@ -38,6 +56,16 @@ case $COMMAND in
     test)
         run_tests
         ;;
+    retest)
+        rerun_failed
+        ;;
+    ci)
+        check
+        run_ci_tests
+        ;;
+    integration)
+        run_integration_tests
+        ;;
     all)
         check
         run_tests
@@ -45,7 +73,7 @@ case $COMMAND in
         ;;
     *)
         echo "Unknown command: $COMMAND"
-        echo "Usage: ./dev.sh [format|check|test|all]"
+        echo "Usage: ./dev.sh [format|check|test|retest|ci|integration|all]"
         exit 1
         ;;
 esac